@@ -1,19 +1,208 @@
 # cows/admin.py
-from django.contrib import admin
-from .models import Cow, Event, CowDocument, Task, Herd 
+import re
+from functools import partial
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import changefeed, tenancy
+from .models import Cow, Event, ArchivedEvent, CowDocument, Task, Herd, HerdReport, Farm, FarmMembership
+
+
+# === WYDAJNOŚĆ LIST DLA DUŻYCH TABEL ===
+def admin_setting(name, default):
+    return getattr(settings, 'ADMIN_PERFORMANCE', {}).get(name, default)
+
+
+def estimated_count(queryset):
+    # Tylko prawdziwe statystyki planera: PostgreSQL (pg_class.reltuples), SQLite
+    # (sqlite_stat1 po ANALYZE - pierwsza liczba to wiersze tabeli). None = brak
+    # statystyk, liczymy dokładnie (rozpiętość id zawyżała tabele z lukami, np. po archiwizacji)
+    connection = connections[queryset.db]; table = queryset.model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    elif connection.vendor == 'sqlite':
+        sql = "SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = %s LIMIT 1"
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table]); row = cursor.fetchone()
+    except DatabaseError:
+        return None  # SQLite bez ANALYZE nie ma tabeli sqlite_stat1
+    return row[0] if row and row[0] and row[0] > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    # Lista bez filtrów i wyszukiwania na dużej tabeli: liczba szacowana; inaczej dokładna
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query') and not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate >= admin_setting('ESTIMATED_COUNT_THRESHOLD', 10000): return estimate
+        return super().count
+
+
+class CachedAllValuesFieldListFilter(admin.AllValuesFieldListFilter):
+    # Lista wartości (SELECT DISTINCT po całej tabeli) liczona raz na FILTER_CACHE_SECONDS
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        key = f"admin_filter_values:{model._meta.label}:{field_path}"
+        choices = cache.get(key)
+        if choices is None:
+            choices = list(self.lookup_choices)
+            cache.set(key, choices, admin_setting('FILTER_CACHE_SECONDS', 300))
+        self.lookup_choices = choices
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # bez dodatkowego COUNT(*) całej tabeli przy filtrach
+    list_per_page = 50
+
+
+class TagPrefixSearchMixin:
+    # Pełny początek NR ARIMR (PL + cyfry) -> zakres po indeksie tag_id
+    # (tag >= 'PL12' AND tag < 'PL12\uffff') zamiast LIKE '%...%' po całej tabeli;
+    # tak działa też autouzupełnianie krów w innych formularzach. Inne frazy
+    # (końcówka kolczyka, nr paszportu, notatki z cyframi) - zwykłe search_fields
+    tag_search_field = 'tag_id'
+    tag_prefix_re = re.compile(r'^PL\d+$')
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip().upper()
+        if self.tag_prefix_re.match(term):
+            field = self.tag_search_field
+            return queryset.filter(**{f'{field}__gte': term, f'{field}__lt': term + '\uffff'}), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+def _publish_bulk(model, rows, op='update', database=DEFAULT_DB_ALIAS):
+    # queryset.update nie wysyła sygnałów - strumień zmian zasilamy po commicie
+    # (rows: (id, herd_id) odczytane jednym SELECT-em przed UPDATE)
+    if rows: transaction.on_commit(partial(changefeed.publish_many, model, rows, op, database=database), using=database)
+
+
+# === AKCJE HURTOWE (jedno UPDATE) ===
+class CowActionForm(ActionForm):
+    status = forms.ChoiceField(choices=[('', '---------')] + Cow.STATUS_CHOICES, required=False, label="Status")
+    herd = forms.ModelChoiceField(queryset=Herd.objects.all(), required=False, label="Stado")
+
+
+@admin.action(description="Zmień status zaznaczonych krów")
+def set_cow_status(modeladmin, request, queryset):
+    new_status = request.POST.get('status')
+    if new_status not in dict(Cow.STATUS_CHOICES):
+        modeladmin.message_user(request, "Wybierz status obok listy akcji.", messages.WARNING); return
+    rows = list(queryset.values_list('id', 'herd_id'))
+    updated = queryset.update(status=new_status, updated_at=timezone.now())
+    _publish_bulk('cow', rows, database=queryset.db)
+    modeladmin.message_user(request, f"Zmieniono status {updated} krów.", messages.SUCCESS)
+
+
+@admin.action(description="Przenieś zaznaczone krowy do stada")
+def set_cow_herd(modeladmin, request, queryset):
+    herd = Herd.objects.filter(pk=request.POST.get('herd') or None).first()
+    if herd is None:
+        modeladmin.message_user(request, "Wybierz stado obok listy akcji.", messages.WARNING); return
+    rows = list(queryset.values_list('id', 'herd_id'))
+    updated = queryset.update(herd=herd, updated_at=timezone.now())
+    tenancy.cow_herds_changed([pk for pk, _ in rows])
+    # Klienci filtrujący po stadzie muszą zobaczyć zarówno odejście, jak i przyjście krowy
+    _publish_bulk('cow', rows + [(pk, herd.pk) for pk, _ in rows], database=queryset.db)
+    modeladmin.message_user(request, f"Przeniesiono {updated} krów do stada {herd}.", messages.SUCCESS)
+
+
+def _task_rows(queryset):
+    return list(queryset.values_list('id', 'herd_id'))
+
+
+@admin.action(description="Oznacz zaznaczone zadania jako wykonane")
+def mark_tasks_completed(modeladmin, request, queryset):
+    queryset = queryset.filter(is_completed=False); rows = _task_rows(queryset)
+    updated = queryset.update(is_completed=True)
+    _publish_bulk('task', rows, database=queryset.db)
+    modeladmin.message_user(request, f"Oznaczono {updated} zadań jako wykonane.", messages.SUCCESS)
+
+
+@admin.action(description="Oznacz zaznaczone zadania jako niewykonane")
+def mark_tasks_open(modeladmin, request, queryset):
+    queryset = queryset.filter(is_completed=True); rows = _task_rows(queryset)
+    updated = queryset.update(is_completed=False)
+    _publish_bulk('task', rows, database=queryset.db)
+    modeladmin.message_user(request, f"Oznaczono {updated} zadań jako niewykonane.", messages.SUCCESS)
+
+
+@admin.register(Farm)
+class FarmAdmin(admin.ModelAdmin):
+    list_display = ['name', 'database']
+    search_fields = ['name']
+
+class FarmMembershipForm(forms.ModelForm):
+    # Stado leży w bazie gospodarstwa (Farm.database), nie w default - lista
+    # i walidacja czytają stada z bazy każdego gospodarstwa
+    herd = forms.TypedChoiceField(coerce=int, empty_value=None, required=False, label="Stado (puste = całe gospodarstwo)")
+
+    class Meta:
+        model = FarmMembership
+        fields = ['user', 'farm', 'herd']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        choices = [('', '---------')]
+        for farm in Farm.objects.order_by('name'):
+            choices.append((farm.name, list(tenancy.farm_herds(farm).values_list('id', 'name'))))
+        self.fields['herd'].choices = choices
+        if self.instance.herd_id: self.initial['herd'] = self.instance.herd_id
+
+    def clean(self):
+        cleaned_data = super().clean(); farm = cleaned_data.get('farm'); herd_id = cleaned_data.get('herd')
+        if herd_id is None: return cleaned_data
+        herd = tenancy.farm_herds(farm).filter(pk=herd_id).first() if farm else None
+        if herd is None: self.add_error('herd', "To stado nie należy do wybranego gospodarstwa.")
+        else: cleaned_data['herd'] = herd
+        return cleaned_data
+
+
+@admin.register(FarmMembership)
+class FarmMembershipAdmin(admin.ModelAdmin):
+    form = FarmMembershipForm
+    list_display = ['user', 'farm', 'herd_name']
+    list_select_related = ['user', 'farm']
+    list_filter = ['farm']
+    search_fields = ['user__username', 'farm__name']
+    autocomplete_fields = ['user', 'farm']
+
+    @admin.display(description="Stado")
+    def herd_name(self, obj):
+        if not obj.herd_id: return "(całe gospodarstwo)"
+        return tenancy.farm_herds(obj.farm).filter(pk=obj.herd_id).values_list('name', flat=True).first() or f"#{obj.herd_id}"
 
 @admin.register(Herd)
 class HerdAdmin(admin.ModelAdmin):
-    list_display = ['name', 'description']
+    list_display = ['name', 'farm', 'description']
+    list_select_related = ['farm']
+    list_filter = ['farm']
     search_fields = ['name']
 
 @admin.register(Cow)
-class CowAdmin(admin.ModelAdmin):
+class CowAdmin(TagPrefixSearchMixin, LargeTableAdmin):
     list_display = ['tag_id', 'name', 'herd', 'status', 'dam', 'sire', 'birth_date', 'gender']
-    list_filter = ['status', 'herd', 'breed', 'gender', 'birth_date']
+    list_select_related = ['herd', 'dam', 'sire']
+    list_filter = ['status', 'herd', ('breed', CachedAllValuesFieldListFilter), 'gender', 'birth_date']
     search_fields = ['tag_id', 'name', 'passport_number'] 
     ordering = ['tag_id']
     autocomplete_fields = ['dam', 'sire', 'herd']
+    action_form = CowActionForm
+    actions = [set_cow_status, set_cow_herd]
     
     fieldsets = (
         (None, {
@@ -44,23 +233,50 @@ class CowAdmin(admin.ModelAdmin):
     )
 
 @admin.register(Event)
-class EventAdmin(admin.ModelAdmin):
+class EventAdmin(TagPrefixSearchMixin, LargeTableAdmin):
+    tag_search_field = 'cow__tag_id'
     list_display = ['cow', 'event_type', 'date', 'user']
+    list_select_related = ['cow', 'user']
     list_filter = ['event_type', 'date', 'user']
     search_fields = ['cow__name', 'cow__tag_id', 'notes']
     autocomplete_fields = ['cow'] 
 
+@admin.register(ArchivedEvent)
+class ArchivedEventAdmin(TagPrefixSearchMixin, LargeTableAdmin):
+    # Archiwum tylko do odczytu (przenosi je komenda archive_events)
+    tag_search_field = 'cow__tag_id'
+    list_display = ['cow', 'event_type', 'date', 'archived_at']
+    list_select_related = ['cow']
+    list_filter = ['event_type', 'date']
+    search_fields = ['cow__tag_id', 'notes']
+    def has_add_permission(self, request): return False
+    def has_change_permission(self, request, obj=None): return False
+
 @admin.register(CowDocument)
-class CowDocumentAdmin(admin.ModelAdmin):
+class CowDocumentAdmin(TagPrefixSearchMixin, LargeTableAdmin):
+    tag_search_field = 'cow__tag_id'
     list_display = ['cow', 'title', 'filename', 'user', 'uploaded_at']
+    list_select_related = ['cow', 'user']
     list_filter = ['user', 'uploaded_at']
     search_fields = ['cow__name', 'cow__tag_id', 'title']
     autocomplete_fields = ['cow']
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(TagPrefixSearchMixin, LargeTableAdmin):
+    tag_search_field = 'cow__tag_id'
     list_display = ['title', 'cow', 'task_type', 'due_date', 'is_completed', 'user']
+    list_select_related = ['cow', 'user']
     list_filter = ['is_completed', 'task_type', 'due_date', 'user']
     search_fields = ['title', 'cow__name', 'cow__tag_id', 'notes']
-    autocomplete_fields = ['cow']
-    list_editable = ['is_completed'] 
+    autocomplete_fields = ['cow', 'herd']
+    list_editable = ['is_completed']
+    actions = [mark_tasks_completed, mark_tasks_open] 
+
+@admin.register(HerdReport)
+class HerdReportAdmin(admin.ModelAdmin):
+    # Wersje raportów tworzy cows/reports.py (komenda build_reports lub API)
+    list_display = ['herd', 'kind', 'period_start', 'period_end', 'version', 'row_count', 'created_at']
+    list_select_related = ['herd']
+    list_filter = ['kind', 'herd', 'period_start']
+    readonly_fields = ['fingerprint', 'summary', 'row_count']
+    def has_add_permission(self, request): return False
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class CowsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cows'
+
+    def ready(self):
+        from django.core import checks
+        from django.db.backends.signals import connection_created
+        from . import signals  # noqa: F401
+        from .archive import attach_archive_database
+        from .metrics import install_query_wrapper
+        from .tenancy import check_require_membership
+        connection_created.connect(install_query_wrapper, dispatch_uid='cows_metrics_query_wrapper')
+        connection_created.connect(attach_archive_database, dispatch_uid='cows_attach_archive_database')
+        checks.register(check_require_membership, checks.Tags.security)
@@ -0,0 +1,108 @@
+# cows/archive.py
+
+# === ARCHIWUM HISTORII ZDARZEŃ ===
+# Zdarzenia starsze niż ARCHIVE['EVENT_HORIZON_DAYS'] przenosimy paczkami do
+# ArchivedEvent (komenda archive_events), żeby tabela Event zostawała mała.
+# Historia krowy czyta obie tabele jednym zapytaniem UNION (event_history).
+# Opcjonalnie archiwum leży w osobnym pliku SQLite: alias z DATABASES podany
+# w ARCHIVE['ATTACH_DATABASE'] jest dołączany (ATTACH DATABASE) do każdego
+# połączenia default, więc UNION i przenoszenie działają w jednej transakcji.
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from .models import ArchivedEvent, Event
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'EVENT_HORIZON_DAYS': 730,   # zdarzenia starsze niż ~2 lata idą do archiwum
+    'BATCH_SIZE': 1000,          # wierszy na transakcję
+    'ATTACH_DATABASE': None,     # alias SQLite z DATABASES dla archiwum (np. 'archive')
+}
+ATTACH_SCHEMA = 'archive'
+EVENT_FIELDS = ['id', 'cow_id', 'event_type', 'date', 'notes', 'user_id', 'created_at', 'updated_at', 'herd_id']
+HISTORY_ORDERING = ['-date', '-created_at', '-id']
+
+
+def get_setting(name):
+    return getattr(settings, 'ARCHIVE', {}).get(name, DEFAULTS[name])
+
+
+def archive_cutoff(horizon_days=None, today=None):
+    horizon_days = get_setting('EVENT_HORIZON_DAYS') if horizon_days is None else horizon_days
+    return (today or timezone.localdate()) - timedelta(days=horizon_days)
+
+
+# === PRZENOSZENIE PACZKAMI ===
+def archive_events_batch(cutoff, batch_size):
+    # Przenosi najstarsze zdarzenia (date < cutoff), maks. batch_size; zwraca liczbę przeniesionych
+    with transaction.atomic(using=Event.objects.db):
+        ids = list(
+            Event.objects.filter(date__lt=cutoff).order_by('date', 'id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids: return 0
+        rows = Event.objects.filter(id__in=ids).values(*EVENT_FIELDS)
+        # ignore_conflicts: po przerwanym przebiegu wiersz może już być w archiwum
+        ArchivedEvent.objects.bulk_create([ArchivedEvent(**row) for row in rows], ignore_conflicts=True)
+        # Bez sygnałów post_delete: archiwizacja to nie usunięcie (strumień zmian nic nie wysyła)
+        moved = Event.objects.filter(id__in=ids)._raw_delete(Event.objects.db)
+    return moved
+
+
+def archive_events(cutoff=None, batch_size=None, max_batches=None, pause=0, progress=None):
+    # Każda paczka to osobna transakcja - blokady krótkie, przerwanie bezpieczne
+    cutoff = cutoff or archive_cutoff()
+    batch_size = batch_size or get_setting('BATCH_SIZE')
+    total = 0; batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_events_batch(cutoff, batch_size)
+        if not moved: break
+        total += moved; batches += 1
+        if progress: progress(batches, moved, total)
+        if pause: time.sleep(pause)
+    logger.info(f"Archiwum: przeniesiono {total} zdarzeń sprzed {cutoff} ({batches} paczek)")
+    return total
+
+
+# === HISTORIA: BIEŻĄCE + ARCHIWUM ===
+def event_history(events, archived, ordering=None):
+    # events/archived: już przefiltrowane querysety Event/ArchivedEvent; wynik to
+    # obiekty Event (UNION ALL), bez podwójnych wierszy, bo id są rozłączne
+    archived = archived.order_by().only(*[f.removesuffix('_id') for f in EVENT_FIELDS])
+    return events.order_by().union(archived, all=True).order_by(*(ordering or HISTORY_ORDERING))
+
+
+def get_archived_event(pk):
+    try: return ArchivedEvent.objects.get(pk=pk)
+    except (ArchivedEvent.DoesNotExist, ValueError, TypeError): return None
+
+
+# === OPCJA: ARCHIWUM W OSOBNYM PLIKU SQLITE ===
+def attach_archive_database(sender=None, connection=None, **kwargs):
+    # Podpinane przy connection_created; nazwy tabel bez schematu SQLite szuka
+    # też w dołączonych bazach, więc ORM nie musi nic wiedzieć o pliku archiwum
+    # (także do repliki - kopia pliku default nie zawiera dołączonego archiwum)
+    from .replicas import replica_alias
+    alias = get_setting('ATTACH_DATABASE')
+    if not alias or connection.alias not in (DEFAULT_DB_ALIAS, replica_alias()) or connection.vendor != 'sqlite': return
+    with connection.cursor() as cursor:
+        cursor.execute(f"ATTACH DATABASE %s AS {ATTACH_SCHEMA}", [str(settings.DATABASES[alias]['NAME'])])
+
+
+class ArchiveRouter:
+    # Tabela archiwum powstaje (migrate --database <alias>) tylko w pliku archiwum,
+    # a w pliku archiwum nie tworzymy nic poza nią
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        alias = get_setting('ATTACH_DATABASE')
+        if not alias: return None
+        # Osobne bazy gospodarstw (TENANCY) trzymają archiwum u siebie
+        from .tenancy import tenant_databases
+        if app_label == 'cows' and model_name == 'archivedevent': return db == alias or db in tenant_databases()
+        if db == alias: return False
+        return None
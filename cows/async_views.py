@@ -0,0 +1,206 @@
+# cows/async_views.py
+
+# === ŚCIEŻKA ODCZYTU ASYNC (ASGI) ===
+# Najczęściej odpytywane endpointy GET w wersji async: zapytania idą przez
+# async ORM, a serializery dostają obiekty z select_related, więc same nie
+# wykonują już żadnych zapytań. Filtry i sortowanie jak w ViewSetach.
+
+import json
+from datetime import date, timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import PermissionDenied
+
+from . import changefeed
+from .authentication import async_jwt_required
+from .filters import CowFilter
+from .models import Cow, Task
+from .pedigree import with_descendants_in_herd
+from .serializers import CowListSerializer, CowSerializer, TaskSerializer
+from .stats import age_statistics
+from .tenancy import request_scope, scope_queryset, tenant_database
+from .views import CowViewSet, TaskViewSet
+
+PAGE_SIZE = settings.REST_FRAMEWORK['PAGE_SIZE']
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+def _apply_search(queryset, request, search_fields):
+    # Jak SearchFilter: każde słowo musi pasować do któregokolwiek pola
+    terms = request.GET.get('search', '').replace(',', ' ').split()
+    for term in terms:
+        condition = Q()
+        for field in search_fields: condition |= Q(**{f'{field}__icontains': term})
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+def _apply_ordering(queryset, request, ordering_fields, default):
+    requested = [f.strip() for f in request.GET.get('ordering', '').split(',') if f.strip()]
+    ordering = [f for f in requested if f.lstrip('-') in ordering_fields]
+    return queryset.order_by(*(ordering or default))
+
+
+def _parse_bool(value):
+    return value.lower() in ('true', '1', 'yes')
+
+
+async def _serialize(serializer_class, source, request, many=True):
+    # Materializacja przez async ORM; serializer działa już tylko na pamięci
+    instances = [obj async for obj in source] if many else source
+    return serializer_class(instances, many=many, context={'request': request, 'tenant': getattr(request, 'tenant', None)}).data
+
+
+async def _paginate(queryset, request, serializer_class):
+    # Ten sam kształt odpowiedzi co PageNumberPagination (PAGE_SIZE z settings)
+    try: page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError: return _json({'detail': 'Nieprawidłowa strona.'}, status=404)
+    count = await queryset.acount(); offset = (page - 1) * PAGE_SIZE
+    if offset and offset >= count: return _json({'detail': 'Nieprawidłowa strona.'}, status=404)
+
+    def page_url(number):
+        params = request.GET.copy(); params['page'] = number
+        return request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+    results = await _serialize(serializer_class, queryset[offset:offset + PAGE_SIZE], request)
+    return _json({
+        'count': count,
+        'next': page_url(page + 1) if offset + PAGE_SIZE < count else None,
+        'previous': page_url(page - 1) if page > 1 else None,
+        'results': results,
+    })
+
+
+def _cow_queryset(request):
+    return scope_queryset(Cow.objects.select_related('dam', 'sire', 'herd'), request.tenant)
+
+
+def _task_queryset(request):
+    return scope_queryset(Task.objects.select_related('cow', 'user'), request.tenant)
+
+
+def tenant_scoped(view_func):
+    # Jak TenantScopedMixin: request.tenant (zakres stad) i baza gospodarstwa na czas
+    # widoku (contextvar przechodzi do wątków async ORM). Po async_jwt_required.
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        try: request.tenant = await sync_to_async(request_scope)(request)
+        except PermissionDenied as e: return _json({'detail': str(e.detail)}, status=403)
+        with tenant_database(request.tenant.alias):
+            return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+# === KROWY ===
+@require_GET
+@async_jwt_required
+@tenant_scoped
+async def cow_list(request):
+    filterset = CowFilter(request.GET, queryset=with_descendants_in_herd(_cow_queryset(request)))
+    if not filterset.is_valid():
+        return _json({'error': f'Nieprawidłowy filtr: {filterset.errors}'}, status=400)
+    queryset = filterset.qs
+    queryset = _apply_search(queryset, request, CowViewSet.search_fields)
+    queryset = _apply_ordering(queryset, request, CowViewSet.ordering_fields, CowViewSet.ordering)
+    return _json(await _serialize(CowListSerializer, queryset, request))
+
+
+@require_GET
+@async_jwt_required
+@tenant_scoped
+async def cow_detail(request, pk):
+    cow = await _cow_queryset(request).filter(pk=pk).afirst()
+    if cow is None: return _json({'detail': 'Nie znaleziono.'}, status=404)
+    return _json(await _serialize(CowSerializer, cow, request, many=False))
+
+
+@require_GET
+@async_jwt_required
+@tenant_scoped
+async def cow_search(request):
+    tag_id = request.GET.get('tag_id', None)
+    if not tag_id: return _json({'error': 'Brak parametru tag_id'}, status=400)
+    cow = await _cow_queryset(request).filter(tag_id=tag_id).afirst()
+    if cow is None: return _json({'error': f'Krowa z tag_id "{tag_id}" nie została znaleziona'}, status=404)
+    return _json(await _serialize(CowSerializer, cow, request, many=False))
+
+
+@require_GET
+@async_jwt_required
+@tenant_scoped
+async def cow_stats(request):
+    today = date.today(); active_cows = scope_queryset(Cow.objects.filter(status='ACTIVE'), request.tenant)
+    total = await active_cows.acount()
+    by_gender = [row async for row in active_cows.values('gender').annotate(count=Count('id'))]
+    birth_dates = [d async for d in active_cows.values_list('birth_date', flat=True)]
+    avg_age, age_histogram_data = age_statistics(birth_dates, total, today)
+    upcoming_tasks_qs = _task_queryset(request).filter(
+        is_completed=False, due_date__gte=today, due_date__lte=today + timedelta(days=7)
+    ).order_by('due_date')
+    return _json({
+        'total_active': total, 'by_gender': by_gender, 'average_age': round(avg_age, 1),
+        'age_histogram': age_histogram_data, 'upcoming_events': await _serialize(TaskSerializer, upcoming_tasks_qs, request)
+    })
+
+
+# === ZADANIA (zakres dat dla kalendarza) ===
+@require_GET
+@async_jwt_required
+@tenant_scoped
+async def task_list(request):
+    queryset = _task_queryset(request)
+    try:
+        for field, lookups in TaskViewSet.filterset_fields.items():
+            for lookup in lookups:
+                param = field if lookup == 'exact' else f'{field}__{lookup}'
+                value = request.GET.get(param)
+                if value in (None, ''): continue
+                if field == 'is_completed': value = _parse_bool(value)
+                queryset = queryset.filter(**{param: value})
+    except (ValueError, ValidationError) as e:
+        return _json({'error': f'Nieprawidłowy filtr: {e}'}, status=400)
+    queryset = _apply_search(queryset, request, TaskViewSet.search_fields)
+    queryset = _apply_ordering(queryset, request, TaskViewSet.ordering_fields, TaskViewSet.ordering)
+    return await _paginate(queryset, request, TaskSerializer)
+
+
+# === STRUMIEŃ ZMIAN (SSE) ===
+# Wymaga serwera ASGI: połączenie trzyma tylko korutynę, nie wątek.
+# Klient subskrybuje wybrane stada (?herd=1&herd=2) i po każdej paczce
+# pobiera wyłącznie encje, które faktycznie się zmieniły. Uwierzytelnia się
+# jednorazowym biletem (?ticket= z POST changes/ticket/), bo EventSource nie
+# wysyła nagłówka Authorization.
+@require_GET
+@async_jwt_required(ticket_param='ticket')
+@tenant_scoped
+async def change_stream(request):
+    try: herds = [int(h) for h in request.GET.getlist('herd')]
+    except ValueError: return _json({'error': 'Nieprawidłowy parametr herd'}, status=400)
+    if request.tenant.restricted:
+        # Subskrypcja tylko stad z zakresu (bez ?herd= - wszystkich dozwolonych)
+        herds = [h for h in herds if request.tenant.allows(h)] if herds else list(request.tenant.herd_ids)
+        if not herds: return _json({'detail': 'Brak dostępu do wskazanych stad.'}, status=403)
+
+    async def events():
+        subscription = changefeed.get_backend().subscribe(herds, request.tenant.alias, request.tenant.restricted)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                batch = await subscription.next_batch(changefeed.get_setting('HEARTBEAT_SECONDS'))
+                if not batch: yield ': ping\n\n'; continue
+                yield f"event: changes\ndata: {json.dumps(batch, ensure_ascii=False)}\n\n"
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'; response['X-Accel-Buffering'] = 'no'
+    return response
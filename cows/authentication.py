@@ -0,0 +1,168 @@
+# cows/authentication.py
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from . import changefeed
+
+
+# === PAMIĘĆ PODRĘCZNA UŻYTKOWNIKÓW Z TOKENA (LRU + TTL) ===
+# Urządzenia synchronizujące wysyłają dziesiątki żądań na minutę; zamiast
+# zapytania o User przy każdym z nich trzymamy krótko ostatnio widzianych.
+# Zapis użytkownika (UserViewSet, set_password, admin) czyści wpis od razu
+# w tym procesie (sygnał w signals.py), a TTL ogranicza opóźnienie w innych
+# workerach - dezaktywacja działa najpóźniej po TTL sekundach.
+class UserCache:
+    def __init__(self, max_size=1024, ttl=30):
+        self.max_size = max_size; self.ttl = ttl
+        self._lock = threading.Lock(); self._entries = OrderedDict()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None: return None
+            user, expires_at = entry
+            if expires_at < time.monotonic(): del self._entries[user_id]; return None
+            self._entries.move_to_end(user_id); return user
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._entries[user_id] = (user, time.monotonic() + self.ttl); self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size: self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock: self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock: self._entries.clear()
+
+
+_cache_settings = getattr(settings, 'AUTH_USER_CACHE', {})
+user_cache = UserCache(max_size=_cache_settings.get('MAX_SIZE', 1024), ttl=_cache_settings.get('TTL_SECONDS', 30))
+
+
+def _user_id_from(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_("Token contained no recognizable user identification"))
+
+
+def _check_user(user, validated_token):
+    # Te same warunki co JWTAuthentication.get_user
+    if not user.is_active:
+        raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+    if api_settings.CHECK_REVOKE_TOKEN:
+        if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id = _user_id_from(validated_token)
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token); user_cache.set(user_id, user); return user
+        return _check_user(user, validated_token)
+
+
+# === BILETY STRUMIENIA ZMIAN ===
+# EventSource w przeglądarce nie pozwala ustawić nagłówka Authorization, a token
+# dostępowy w ?token= trafiałby do logów serwera i proxy. Klient wymienia więc
+# token (POST changes/ticket/) na krótkotrwały, jednorazowy bilet podpisany
+# SECRET_KEY, ważny tylko dla strumienia zmian. Zużycie biletu zapisujemy w CACHES -
+# przy wielu workerach musi to być wspólny cache (np. Redis).
+STREAM_TICKET_SALT = 'cows.changefeed.stream-ticket'
+STREAM_TICKET_USED_KEY = 'stream_ticket_used:{}'
+
+
+def issue_stream_ticket(user, farm_id=None):
+    # farm_id: nagłówek X-Farm-Id żądania wydającego bilet (EventSource go nie wyśle)
+    payload = {'user': user.pk, 'farm': farm_id, 'nonce': secrets.token_urlsafe(12)}
+    return signing.dumps(payload, salt=STREAM_TICKET_SALT, compress=True), changefeed.get_setting('TICKET_SECONDS')
+
+
+async def aredeem_stream_ticket(ticket):
+    # Zwraca treść biletu; AuthenticationFailed dla złego, wygasłego lub użytego
+    max_age = changefeed.get_setting('TICKET_SECONDS')
+    try:
+        payload = signing.loads(ticket, salt=STREAM_TICKET_SALT, max_age=max_age)
+    except signing.BadSignature:  # także SignatureExpired
+        raise AuthenticationFailed("Bilet strumienia zmian jest nieprawidłowy lub wygasł.", code="ticket_invalid")
+    if not await cache.aadd(STREAM_TICKET_USED_KEY.format(payload['nonce']), True, max_age):
+        raise AuthenticationFailed("Bilet strumienia zmian został już użyty.", code="ticket_used")
+    return payload
+
+
+# === UWIERZYTELNIANIE JWT DLA WIDOKÓW ASYNC ===
+# DRF 3.14 nie obsługuje widoków async, więc dla ścieżek ASGI walidujemy token
+# tak samo jak JWTAuthentication, a użytkownika pobieramy przez async ORM
+# (z tej samej pamięci podręcznej co CachedJWTAuthentication).
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    # ticket_param: parametr z biletem strumienia zmian (gdy brak nagłówka);
+    # request.auth jest wtedy treścią biletu zamiast tokena
+    def __init__(self, *args, ticket_param=None, **kwargs):
+        super().__init__(*args, **kwargs); self.ticket_param = ticket_param
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            ticket = request.GET.get(self.ticket_param) if self.ticket_param else None
+            if not ticket: return None
+            payload = await aredeem_stream_ticket(ticket)
+            return await self.afetch_user(payload['user']), payload
+        raw_token = self.get_raw_token(header)
+        if raw_token is None: return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        return _check_user(await self.afetch_user(_user_id_from(validated_token)), validated_token)
+
+    async def afetch_user(self, user_id):
+        user = user_cache.get(user_id)
+        if user is None:
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            if user.is_active: user_cache.set(user_id, user)
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+
+def async_jwt_required(view_func=None, *, ticket_param=None):
+    # Odpowiednik permission_classes = [IsAuthenticated] dla widoków async
+    if view_func is None: return partial(async_jwt_required, ticket_param=ticket_param)
+    authenticator = AsyncJWTAuthentication(ticket_param=ticket_param)
+
+    def unauthorized(request, detail):
+        response = JsonResponse(detail if isinstance(detail, dict) else {'detail': detail}, status=401, json_dumps_params={'ensure_ascii': False})
+        response['WWW-Authenticate'] = authenticator.authenticate_header(request); return response
+
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            result = await authenticator.aauthenticate(request)
+        except (InvalidToken, AuthenticationFailed) as e:
+            return unauthorized(request, e.detail)
+        if result is None:
+            return unauthorized(request, 'Nie podano danych uwierzytelniających.')
+        request.user, request.auth = result
+        return await view_func(request, *args, **kwargs)
+    return wrapper
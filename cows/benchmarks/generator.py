@@ -0,0 +1,119 @@
+# cows/benchmarks/generator.py
+
+# === DETERMINISTYCZNY GENERATOR STADA ===
+# Ten sam seed daje zawsze to samo stado: N krów w kilku stadach, kilka
+# pokoleń z powiązaniami matka/ojciec, zdarzenia, zadania oraz skoroszyt
+# w układzie rejestru ARiMR (arkusz = stado, nagłówki jak w imporcie).
+
+import io
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+
+from ..models import Cow, Event, Herd, Task
+from ..pedigree import rebuild_all
+
+BREEDS = ['HIGHLAND', 'HIGHLAND X ANGUS', 'HIGHLAND X LIMOUSINE']
+COLORS = ['RUDA', 'CZARNA', 'PŁOWA', 'BRĄZOWA', 'SREBRNA']
+EVENT_TYPES = [choice for choice, _ in Event.EVENT_TYPE_CHOICES]
+TASK_TYPES = [choice for choice, _ in Task.TASK_TYPE_CHOICES]
+
+# Kolumny arkusza w kolejności typowej dla zestawienia ARiMR
+ARIMR_HEADERS = [
+    'NR ARIMR', 'NAZWA', 'DATA UR', 'PŁEĆ', 'RASA', 'MAŚĆ', 'NR PASZPORTU', 'STATUS',
+    'NR MATKI', 'NR OJCA', 'DATA SPRZEDAŻY/PADNIĘCIA', 'NABYWCA/PRZYCZYNA', 'KWOTA',
+    'WAGA', 'PRZYROST/DZIEŃ', 'UWAGI', 'NUMER DZIALALNOSCI',
+]
+
+
+class HerdGenerator:
+    def __init__(self, seed=42, cows=1000, herds=4, generations=5, events_per_cow=5, tasks_per_cow=0.3, today=None):
+        self.seed = seed; self.cows = cows; self.herds = herds; self.generations = max(generations, 1)
+        self.events_per_cow = events_per_cow; self.tasks_per_cow = tasks_per_cow
+        self.today = today or date.today()
+
+    def tag(self, index):
+        return f"PL{self.seed % 100:02d}{index:010d}"
+
+    def _cow_rows(self, rng, count, offset=0):
+        # Zwraca listę słowników: pokolenie, płeć, rodzice (indeksy) itd.
+        per_generation = max(count // self.generations, 1); rows = []
+        dams = [[] for _ in range(self.generations)]; sires = [[] for _ in range(self.generations)]
+        for index in range(count):
+            generation = min(index // per_generation, self.generations - 1)
+            # Pokolenie 0 urodzone najdawniej; kolejne co ok. 3 lata
+            years_back = (self.generations - generation) * 3 + rng.randint(0, 2)
+            birth_date = self.today - timedelta(days=365 * years_back + rng.randint(0, 364))
+            row = {
+                'index': offset + index, 'generation': generation, 'gender': 'F' if rng.random() < 0.6 else 'M',
+                'herd': index % self.herds, 'birth_date': birth_date, 'dam': None, 'sire': None,
+                'breed': rng.choice(BREEDS), 'color': rng.choice(COLORS),
+                'weight': round(rng.uniform(250, 750), 1), 'status': 'ACTIVE',
+            }
+            if generation > 0:
+                if dams[generation - 1]: row['dam'] = rng.choice(dams[generation - 1])
+                if sires[generation - 1] and rng.random() < 0.8: row['sire'] = rng.choice(sires[generation - 1])
+            (dams if row['gender'] == 'F' else sires)[generation].append(row['index'])
+            roll = rng.random()
+            if roll < 0.08: row['status'] = 'SOLD'
+            elif roll < 0.12: row['status'] = 'ARCHIVED'
+            rows.append(row)
+        return rows
+
+    # === ZAPIS DO BAZY (bulk_create pokolenie po pokoleniu) ===
+    def build(self):
+        rng = random.Random(self.seed)
+        user, _ = User.objects.get_or_create(username='benchmark', defaults={'is_staff': True, 'is_superuser': True})
+        herds = [Herd.objects.get_or_create(name=f"STADO{n + 1}")[0] for n in range(self.herds)]
+        rows = self._cow_rows(rng, self.cows); ids = {}
+        for generation in range(self.generations):
+            batch = [r for r in rows if r['generation'] == generation]
+            created = Cow.objects.bulk_create([
+                Cow(
+                    tag_id=self.tag(r['index']), name=f"Krowa {r['index']}", gender=r['gender'], herd=herds[r['herd']],
+                    birth_date=r['birth_date'], breed=r['breed'], color=r['color'], weight=r['weight'], status=r['status'],
+                    dam_id=ids.get(r['dam']), sire_id=ids.get(r['sire']),
+                    passport_number=f"PP{r['index']:08d}",
+                ) for r in batch
+            ], batch_size=500)
+            ids.update({r['index']: cow.id for r, cow in zip(batch, created)})
+        events = []; tasks = []
+        for r in rows:
+            cow_id = ids[r['index']]; age_days = max((self.today - r['birth_date']).days, 1)
+            for _ in range(self.events_per_cow):
+                events.append(Event(
+                    cow_id=cow_id, herd=herds[r['herd']], event_type=rng.choice(EVENT_TYPES), user=user,
+                    date=r['birth_date'] + timedelta(days=rng.randint(0, age_days)), notes='Zdarzenie testowe',
+                ))
+            if rng.random() < self.tasks_per_cow:
+                tasks.append(Task(
+                    cow_id=cow_id, herd=herds[r['herd']], title=f"Zadanie {r['index']}", task_type=rng.choice(TASK_TYPES), user=user,
+                    due_date=self.today + timedelta(days=rng.randint(-30, 30)), is_completed=rng.random() < 0.3,
+                ))
+        Event.objects.bulk_create(events, batch_size=1000); Task.objects.bulk_create(tasks, batch_size=1000)
+        rebuild_all()  # bulk_create pomija sygnały - liczniki i domknięcie rodowodu liczymy na końcu
+        return {'user': user, 'herds': herds, 'cow_ids': [ids[r['index']] for r in rows], 'rows': rows}
+
+    # === SKOROSZYT W UKŁADZIE ARiMR ===
+    def workbook(self, rows_count, offset=None):
+        from openpyxl import Workbook
+        # Domyślnie połowa wierszy aktualizuje istniejące krowy, połowa to nowe
+        rng = random.Random(self.seed + 1); offset = self.cows // 2 if offset is None else offset
+        rows = self._cow_rows(rng, rows_count, offset=offset)
+        wb = Workbook(write_only=True)
+        sheets = [wb.create_sheet(f"STADO{n + 1} {self.today.year}") for n in range(self.herds)]
+        for sheet in sheets: sheet.append(ARIMR_HEADERS)
+        for r in rows:
+            status = {'SOLD': 'SPRZEDANA', 'ARCHIVED': 'PADŁA'}.get(r['status'], 'W STADZIE')
+            sold = r['status'] == 'SOLD'
+            sheets[r['herd']].append([
+                self.tag(r['index']), f"Krowa {r['index']}", r['birth_date'],
+                'SAMICA' if r['gender'] == 'F' else 'SAMIEC', r['breed'], r['color'], f"PP{r['index']:08d}", status,
+                self.tag(r['dam']) if r['dam'] is not None else None, self.tag(r['sire']) if r['sire'] is not None else None,
+                self.today - timedelta(days=rng.randint(1, 300)) if sold else None, 'Ubojnia' if sold else None,
+                round(rng.uniform(3000, 9000), 2) if sold else None,
+                str(r['weight']).replace('.', ','), round(rng.uniform(0.4, 1.2), 2), None, '123456789',
+            ])
+        buffer = io.BytesIO(); wb.save(buffer); buffer.seek(0)
+        return buffer
@@ -0,0 +1,158 @@
+# cows/benchmarks/runner.py
+
+# === SCENARIUSZE BENCHMARKU ===
+# Każdy scenariusz to przygotowanie (poza pomiarem) i funkcja wykonująca
+# jedno żądanie przez klienta API z prawdziwym tokenem JWT. Mierzymy czas
+# (mediana i p95 z kilku powtórzeń), liczbę zapytań SQL i szczytową pamięć
+# (osobny przebieg z tracemalloc, żeby nie zawyżał czasu).
+
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .. import metrics
+from ..models import Cow, Task
+
+# baselines.json: bieżące wyniki bazowe (porównanie i --save-baseline);
+# baselines_before.json: historyczny pomiar sprzed optymalizacji, tylko do wglądu
+BASELINES_PATH = Path(__file__).with_name('baselines.json')
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class Scenario:
+    def __init__(self, name, setup, run, repeat=5, warmup=True):
+        self.name = name; self.setup = setup; self.run = run; self.repeat = repeat; self.warmup = warmup
+
+
+def _expect(response, status=200):
+    if response.status_code != status:
+        raise AssertionError(f"Oczekiwano {status}, otrzymano {response.status_code}: {response.content[:300]!r}")
+    return response
+
+
+# === PRZYGOTOWANIE I WYKONANIE POSZCZEGÓLNYCH SCENARIUSZY ===
+def _setup_search(ctx):
+    rng = random.Random(ctx.generator.seed)
+    ctx.search_tags = [ctx.generator.tag(r['index']) for r in rng.sample(ctx.data['rows'], min(50, len(ctx.data['rows'])))]
+
+
+def _run_search(ctx):
+    tag = ctx.search_tags[ctx.counter % len(ctx.search_tags)]; ctx.counter += 1
+    _expect(ctx.client.get('/api/cows/search/', {'tag_id': tag}))
+
+
+def _setup_pedigree(ctx):
+    # Krowa z ostatniego pokolenia ma najgłębszy rodowód
+    last = [r for r in ctx.data['rows'] if r['generation'] == ctx.generator.generations - 1 and r['dam'] is not None]
+    row = last[0] if last else ctx.data['rows'][-1]
+    ctx.pedigree_id = Cow.objects.get(tag_id=ctx.generator.tag(row['index'])).id
+
+
+def _setup_import(ctx):
+    ctx.workbook = ctx.generator.workbook(ctx.options['import_rows']).getvalue()
+
+
+def _run_import(ctx):
+    upload = SimpleUploadedFile('rejestr.xlsx', ctx.workbook, content_type=XLSX_CONTENT_TYPE)
+    _expect(ctx.client.post('/api/cows/import-excel/', {'file': upload}, format='multipart'))
+
+
+def _setup_sync(ctx):
+    rng = random.Random(ctx.generator.seed + 2)
+    active = list(Cow.objects.filter(status='ACTIVE').values_list('id', flat=True))
+    tasks = list(Task.objects.values_list('id', flat=True)); jobs = []
+    for n in range(ctx.options['sync_jobs']):
+        roll = rng.random(); cow_id = rng.choice(active)
+        if roll < 0.4:
+            job = {'action': 'updateCow', 'entityId': cow_id, 'payload': {'weight': round(rng.uniform(250, 750), 1)}}
+        elif roll < 0.7:
+            job = {'action': 'createEvent', 'tempId': -(n + 1), 'payload': {'cow': cow_id, 'event_type': 'KONTROLA', 'date': '2024-01-01'}}
+        elif roll < 0.9 or not tasks:
+            job = {'action': 'createTask', 'tempId': -(n + 1), 'payload': {'cow': cow_id, 'title': 'Sync', 'due_date': '2024-01-01'}}
+        else:
+            job = {'action': 'updateTask', 'entityId': rng.choice(tasks), 'payload': {'is_completed': True}}
+        job['id'] = n + 1; jobs.append(job)
+    ctx.sync_body = json.dumps({'jobs': jobs})
+
+
+def _run_sync(ctx):
+    response = _expect(ctx.client.post('/api/sync/', ctx.sync_body, content_type='application/json'))
+    errors = [r for r in response.json()['results'] if r['status'] == 'error']
+    if errors: raise AssertionError(f"Błędy synchronizacji: {errors[:3]}")
+
+
+SCENARIOS = [
+    Scenario('cow_list', None, lambda ctx: _expect(ctx.client.get('/api/cows/'))),
+    Scenario('scanner_search', _setup_search, _run_search, repeat=20),
+    Scenario('stats', None, lambda ctx: _expect(ctx.client.get('/api/cows/stats/'))),
+    Scenario('pedigree', _setup_pedigree, lambda ctx: _expect(ctx.client.get(f'/api/cows/{ctx.pedigree_id}/pedigree/')), repeat=20),
+    Scenario('import_excel', _setup_import, _run_import, repeat=1, warmup=False),
+    Scenario('sync_batch', _setup_sync, _run_sync, repeat=1, warmup=False),
+]
+
+
+class BenchmarkContext:
+    def __init__(self, generator, data, options):
+        self.generator = generator; self.data = data; self.options = options; self.counter = 0
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(data['user']).access_token}")
+
+
+def measure(scenario, ctx):
+    if scenario.setup: scenario.setup(ctx)
+    if scenario.warmup: scenario.run(ctx)
+    timings = []
+    for _ in range(scenario.repeat):
+        started = time.perf_counter(); scenario.run(ctx); timings.append((time.perf_counter() - started) * 1000)
+    # Osobny przebieg: liczba zapytań i szczytowa pamięć
+    metrics.install_query_wrapper(connection=connection)
+    stats, token = metrics.start_collecting(); tracemalloc.start()
+    try:
+        scenario.run(ctx)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop(); metrics.stop_collecting(token)
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        'queries': stats.queries,
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+# === PORÓWNANIE Z ZAPISANYMI WYNIKAMI BAZOWYMI ===
+def load_baselines(path=BASELINES_PATH):
+    if not Path(path).exists(): return {}
+    return json.loads(Path(path).read_text(encoding='utf-8'))
+
+
+def save_baselines(results, params, path=BASELINES_PATH):
+    # Przy tych samych parametrach dopisujemy do istniejących wyników (np. --scenario)
+    baselines = load_baselines(path)
+    scenarios = baselines.get('scenarios', {}) if baselines.get('params') == params else {}
+    scenarios.update(results)
+    Path(path).write_text(json.dumps({'params': params, 'scenarios': scenarios}, indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+
+
+def compare(results, baselines, tolerance):
+    # Zwraca listę regresji: (scenariusz, metryka, bazowa, obecna)
+    regressions = []
+    for name, result in results.items():
+        base = baselines.get('scenarios', {}).get(name)
+        if not base: continue
+        for metric in ('median_ms', 'p95_ms', 'peak_kb'):
+            if metric in base and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append((name, metric, base[metric], result[metric]))
+        # Liczba zapytań jest deterministyczna - każdy wzrost to regresja
+        if 'queries' in base and result['queries'] > base['queries']:
+            regressions.append((name, 'queries', base['queries'], result['queries']))
+    return regressions
@@ -0,0 +1,134 @@
+# cows/changefeed.py
+
+# === STRUMIEŃ ZMIAN (change feed) ===
+# Sygnały post_save/post_delete publikują zwięzłe komunikaty
+# {model, id, op, updated_at, db}; subskrybenci (połączenia SSE) dostają je
+# pogrupowane i scalone po (model, id). Backend jest wymienny przez
+# settings.CHANGEFEED['BACKEND'] - domyślny działa w pamięci jednego procesu.
+# Id stad i encji są unikalne tylko w obrębie bazy (osobne bazy gospodarstw),
+# więc subskrypcja dotyczy jednej bazy, a filtr stad działa w jej obrębie.
+
+import asyncio
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'cows.changefeed.InMemoryBroadcastBackend',
+    'COALESCE_SECONDS': 0.5,   # okno zbierania zmian przed wysłaniem paczki
+    'HEARTBEAT_SECONDS': 15,   # komentarz SSE, gdy nic się nie dzieje
+    'MAX_PENDING': 1000,       # powyżej tego klient dostaje 'resync'
+    'TICKET_SECONDS': 60,      # ważność biletu strumienia (authentication.issue_stream_ticket)
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'CHANGEFEED', {}).get(name, DEFAULTS[name])
+
+
+def build_message(model, pk, op, updated_at=None, database=None):
+    updated_at = updated_at or timezone.now()
+    return {'model': model, 'id': pk, 'op': op, 'updated_at': updated_at.isoformat(), 'db': database or DEFAULT_DB_ALIAS}
+
+
+# === INTERFEJS BACKENDU ===
+class BaseBroadcastBackend:
+    def publish(self, message, herd_id=None):
+        # Wywoływane z dowolnego wątku (widoki sync, sygnały); baza w message['db']
+        raise NotImplementedError
+
+    def subscribe(self, herds=None, database=None, restricted=False):
+        # Zwraca obiekt z `async next_batch(timeout)` i `close()`;
+        # wywoływane z pętli zdarzeń połączenia
+        raise NotImplementedError
+
+
+class Subscription:
+    # restricted: użytkownik z ograniczonym zakresem (tenancy) - nie dostaje zmian bez stada
+    def __init__(self, backend, herds, max_pending, database=None, restricted=False):
+        self.backend = backend; self.herds = set(herds) if herds else None
+        self.database = database or DEFAULT_DB_ALIAS; self.restricted = restricted
+        self.loop = asyncio.get_running_loop(); self.max_pending = max_pending
+        self._pending = {}; self._overflow = False; self._ready = asyncio.Event()
+
+    def matches(self, herd_id, database=None):
+        if (database or DEFAULT_DB_ALIAS) != self.database: return False
+        # Zmiany bez stada (np. zadanie bez krowy) - tylko dla subskrybentów bez ograniczeń
+        if herd_id is None: return not self.restricted
+        return self.herds is None or herd_id in self.herds
+
+    def push(self, message):
+        # Zawsze w wątku pętli (call_soon_threadsafe); scalanie po (model, id)
+        key = (message['model'], message['id'])
+        self._pending.pop(key, None); self._pending[key] = message
+        if len(self._pending) > self.max_pending: self._pending.clear(); self._overflow = True
+        self._ready.set()
+
+    async def next_batch(self, timeout):
+        try: await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError: return []
+        await asyncio.sleep(get_setting('COALESCE_SECONDS'))
+        if self._overflow:
+            batch = [{'op': 'resync', 'updated_at': timezone.now().isoformat()}]
+        else:
+            batch = list(self._pending.values())
+        self._pending = {}; self._overflow = False; self._ready.clear()
+        return batch
+
+    def close(self):
+        self.backend.unsubscribe(self)
+
+
+class InMemoryBroadcastBackend(BaseBroadcastBackend):
+    def __init__(self):
+        self._lock = threading.Lock(); self._subscribers = set()
+
+    def subscribe(self, herds=None, database=None, restricted=False):
+        subscription = Subscription(self, herds, get_setting('MAX_PENDING'), database, restricted)
+        with self._lock: self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock: self._subscribers.discard(subscription)
+
+    def publish(self, message, herd_id=None):
+        with self._lock: subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if not subscription.matches(herd_id, message['db']): continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, message)
+            except RuntimeError:
+                # Pętla połączenia już zamknięta
+                self.unsubscribe(subscription)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None: _backend = import_string(get_setting('BACKEND'))()
+    return _backend
+
+
+def publish(model, pk, op, updated_at=None, herd_id=None, database=None):
+    try:
+        get_backend().publish(build_message(model, pk, op, updated_at, database), herd_id=herd_id)
+    except Exception as e:
+        # Strumień zmian nie może blokować zapisu danych
+        logger.error(f"Błąd publikacji zmiany {model}:{pk}: {str(e)}")
+
+
+def publish_many(model, rows, op, updated_at=None, database=None):
+    # rows: [(pk, herd_id)] - po zapisach hurtowych (queryset.update) bez sygnałów
+    updated_at = updated_at or timezone.now()
+    for pk, herd_id in rows: publish(model, pk, op, updated_at, herd_id=herd_id, database=database)
@@ -0,0 +1,39 @@
+# cows/exporters.py
+
+# === EKSPORT REJESTRU DO EXCELA ===
+# Ładowany leniwie (openpyxl tylko przy eksporcie). Układ pliku jest zgodny
+# z importem: arkusz = stado, nagłówki z COLUMN_MAP, rodzice jako NR ARIMR
+# (rodzic spoza zakresu użytkownika - z innego gospodarstwa - zostaje pusty).
+
+import io
+
+from .importers import COLUMN_MAP
+from .models import Cow
+
+STATUS_LABELS = {'ACTIVE': 'W STADZIE', 'SOLD': 'SPRZEDANA', 'ARCHIVED': 'PADŁA', 'OTHER': 'INNY'}
+GENDER_LABELS = {'F': 'SAMICA', 'M': 'SAMIEC'}
+NO_HERD_SHEET = 'BEZ_STADA'
+
+
+def export_workbook(queryset=None, scope=None):
+    from openpyxl import Workbook
+
+    queryset = (queryset if queryset is not None else Cow.objects.all())
+    queryset = queryset.select_related('herd', 'dam', 'sire').order_by('herd__name', 'tag_id')
+    headers = list(COLUMN_MAP.keys()); fields = list(COLUMN_MAP.values())
+    wb = Workbook(write_only=True); sheets = {}
+    def parent_tag(parent): return parent.tag_id if parent and (scope is None or scope.allows(parent.herd_id)) else None
+    for cow in queryset.iterator(chunk_size=2000):
+        sheet_name = cow.herd.name if cow.herd else NO_HERD_SHEET
+        sheet = sheets.get(sheet_name)
+        if sheet is None:
+            sheet = sheets[sheet_name] = wb.create_sheet(sheet_name[:31]); sheet.append(headers)
+        values = {
+            'dam_tag': parent_tag(cow.dam), 'sire_tag': parent_tag(cow.sire),
+            'status': STATUS_LABELS.get(cow.status, cow.status), 'gender': GENDER_LABELS.get(cow.gender, cow.gender),
+            'sale_price': float(cow.sale_price) if cow.sale_price is not None else None,
+        }
+        sheet.append([values[f] if f in values else getattr(cow, f) for f in fields])
+    if not sheets: wb.create_sheet(NO_HERD_SHEET).append(headers)
+    buffer = io.BytesIO(); wb.save(buffer); buffer.seek(0)
+    return buffer
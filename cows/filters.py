@@ -0,0 +1,33 @@
+# cows/filters.py
+
+import django_filters
+from django.db.models import Q
+
+from .models import Cow
+
+
+class CowFilter(django_filters.FilterSet):
+    # herd jako liczba (bez zapytania walidującego) - filtr działa też w widokach async
+    herd = django_filters.NumberFilter(field_name='herd')
+    # Filtry hodowlane: liczniki potomstwa i tabela domknięcia rodowodu (indeksy)
+    min_offspring = django_filters.NumberFilter(method='filter_min_offspring', label="Minimalna liczba potomstwa")
+    descendant_of = django_filters.NumberFilter(method='filter_lineage', field_name='lineage_ancestors__ancestor', label="Potomkowie krowy (id)")
+    ancestor_of = django_filters.NumberFilter(method='filter_lineage', field_name='lineage_descendants__descendant', label="Przodkowie krowy (id)")
+    max_generation = django_filters.NumberFilter(method='filter_max_generation', label="Maks. pokolenie (z descendant_of/ancestor_of)")
+
+    class Meta:
+        model = Cow
+        fields = ['gender', 'breed', 'status', 'herd']
+
+    def filter_min_offspring(self, queryset, name, value):
+        return queryset.filter(Q(offspring_as_dam_count__gte=value) | Q(offspring_as_sire_count__gte=value))
+
+    def filter_lineage(self, queryset, name, value):
+        # Jeden warunek na ten sam wiersz domknięcia (krowa + pokolenie)
+        relation = name.split('__')[0]; conditions = {name: value}
+        max_generation = self.form.cleaned_data.get('max_generation')
+        if max_generation: conditions[f'{relation}__depth__lte'] = max_generation
+        return queryset.filter(**conditions)
+
+    def filter_max_generation(self, queryset, name, value):
+        return queryset  # uwzględniane w filter_lineage
@@ -0,0 +1,392 @@
+# cows/importers.py
+
+# === IMPORT REJESTRU Z EXCELA ===
+# Moduł ładowany dopiero przy imporcie (patrz CowViewSet.import_excel).
+# Skoroszyt czytamy strumieniowo (openpyxl read_only) arkusz po arkuszu,
+# a wiersze trafiają do bazy paczkami po IMPORT_BATCH_SIZE - szczytowe
+# zużycie pamięci zależy od rozmiaru paczki, a nie całego pliku.
+
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import changefeed, pedigree, tenancy
+from .models import Cow, Herd, ImportPreview
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+# === PEŁNA MAPA KOLUMN ===
+COLUMN_MAP = {
+    'NR ARIMR': 'tag_id', 'NAZWA': 'name', 'DATA UR': 'birth_date',
+    'PŁEĆ': 'gender', 'RASA': 'breed', 'MAŚĆ': 'color',
+    'NR PASZPORTU': 'passport_number', 'STATUS': 'status',
+    'NR MATKI': 'dam_tag', 'NR OJCA': 'sire_tag',
+    'DATA SPRZEDAŻY/PADNIĘCIA': 'exit_date', 'NABYWCA/PRZYCZYNA': 'exit_reason',
+    'KWOTA': 'sale_price', 'DOSTAWA MIĘSA': 'meat_delivery_date', 'UWAGI': 'notes',
+    'WAGA': 'weight', 'PRZYROST/DZIEŃ': 'daily_weight_gain',
+    'DŁUGOŚĆ ISTNIEJĄCEJ CIĄŻY': 'pregnancy_duration',
+    'MOŻLIWOŚĆ BYCIA CIELNĄ WG ZESTAWIENIA': 'is_pregnancy_possible',
+    'RELOKACJA': 'relocation_status',
+    'DUPLIKATY DO ZALOZENIA': 'duplicates_to_make',
+    'ZAMOWIC KOLCZYKI DUPLIKATY': 'duplicates_to_order',
+    'RELKOACJA PO PRXEPEDZIE': 'relocation_after_drive',
+    'NUMER DZIALALNOSCI': 'business_number'
+}
+
+STRING_FIELDS = [
+    'breed', 'color', 'passport_number', 'business_number', 'exit_reason', 'notes',
+    'pregnancy_duration', 'is_pregnancy_possible', 'relocation_status',
+    'duplicates_to_make', 'duplicates_to_order', 'relocation_after_drive',
+]
+DATE_FIELDS = ['birth_date', 'exit_date', 'meat_delivery_date']
+FLOAT_FIELDS = ['sale_price', 'weight', 'daily_weight_gain']
+DATE_FORMATS = ['%Y-%m-%d', '%d.%m.%Y', '%d-%m-%Y', '%d/%m/%Y', '%Y.%m.%d', '%Y-%m-%d %H:%M:%S']
+
+
+# === CZYSZCZENIE WARTOŚCI KOMÓREK ===
+def clean_string(str_val):
+    if str_val is None: return None
+    if isinstance(str_val, float) and str_val.is_integer(): str_val = int(str_val)
+    return str(str_val).strip()
+
+
+def clean_date(date_val):
+    if date_val is None or date_val == '': return None
+    if isinstance(date_val, datetime): return date_val.date()
+    if isinstance(date_val, date): return date_val
+    if isinstance(date_val, (int, float)):
+        # Data zapisana jako liczba seryjna Excela
+        from openpyxl.utils.datetime import from_excel
+        try: return from_excel(date_val).date()
+        except (ValueError, OverflowError, TypeError): return None
+    text = str(date_val).strip()
+    for fmt in DATE_FORMATS:
+        try: return datetime.strptime(text, fmt).date()
+        except ValueError: continue
+    return None
+
+
+def clean_float(float_val):
+    if float_val is None or float_val == '': return None
+    try:
+        cleaned_val = str(float_val).replace(',', '.')
+        return float(cleaned_val)
+    except (TypeError, ValueError): return None
+
+
+class ImportRow:
+    __slots__ = ('sheet', 'row_number', 'herd_name', 'tag_id', 'fields', 'dam_tag', 'sire_tag')
+
+    def __init__(self, sheet, row_number, herd_name, tag_id, fields, dam_tag, sire_tag):
+        self.sheet = sheet; self.row_number = row_number; self.herd_name = herd_name; self.tag_id = tag_id
+        self.fields = fields; self.dam_tag = dam_tag; self.sire_tag = sire_tag
+
+
+def parse_record(record, tag_id):
+    # Zwraca pola krowy (bez stada) - tylko te, które mają wartość
+    gender_raw = clean_string(record.get('gender')) or ''
+    gender = 'F' if 'SAMICA' in gender_raw or 'JAŁÓWKA' in gender_raw else 'M'
+    status_raw = clean_string(record.get('status')) or ''
+    cow_status = 'SOLD' if 'SPRZEDAN' in status_raw else \
+                 'ARCHIVED' if 'PADŁ' in status_raw else 'ACTIVE'
+    defaults = {'name': clean_string(record.get('name')) or f"Krowa {tag_id}", 'gender': gender, 'status': cow_status}
+    defaults.update({f: clean_string(record.get(f)) for f in STRING_FIELDS})
+    defaults.update({f: clean_date(record.get(f)) for f in DATE_FIELDS})
+    defaults.update({f: clean_float(record.get(f)) for f in FLOAT_FIELDS})
+    return {k: v for k, v in defaults.items() if v is not None}
+
+
+# === STRUMIENIOWE CZYTANIE SKOROSZYTU ===
+def read_rows(file, errors):
+    # Generator ImportRow; błędy wierszy (np. brak NR ARIMR) dopisuje do errors
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            sheet_name = sheet.title
+            herd_name = sheet_name.split(' ')[0].strip().upper()
+            if not herd_name:
+                errors.append(f"Arkus_ {sheet_name} ma nieprawidłową nazwę.")
+                continue
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None: continue
+            columns = [COLUMN_MAP.get(str(col).strip().upper()) if col is not None else None for col in header]
+            for index, values in enumerate(rows):
+                if not any(v is not None and v != '' for v in values): continue  # pusty wiersz
+                record = {col: val for col, val in zip(columns, values) if col is not None}
+                tag_id = clean_string(record.get('tag_id'))
+                if not tag_id:
+                    errors.append(f"Arkus_ {sheet_name}, Wiersz {index + 2}: Brak 'NR ARIMR'")
+                    continue
+                yield ImportRow(
+                    sheet_name, index + 2, herd_name, tag_id, parse_record(record, tag_id),
+                    clean_string(record.get('dam_tag')), clean_string(record.get('sire_tag')),
+                )
+    finally:
+        workbook.close()
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def scoped_rows(rows, scope, errors):
+    # Użytkownik przypisany do gospodarstwa/stad importuje tylko do istniejących
+    # stad ze swojego zakresu i nie nadpisuje cudzych krów (zapytanie na paczkę)
+    if scope is None or not scope.restricted: yield from rows; return
+    herds = set(Herd.objects.filter(id__in=scope.herd_ids).values_list('name', flat=True))
+    for batch in batched(rows, DEFAULT_BATCH_SIZE):
+        outside = set(Cow.objects.filter(tag_id__in=[row.tag_id for row in batch]).exclude(herd_id__in=scope.herd_ids).values_list('tag_id', flat=True))
+        for row in batch:
+            if row.herd_name not in herds:
+                errors.append(f"Arkus_ {row.sheet}, Wiersz {row.row_number} (Tag: {row.tag_id}): Stado {row.herd_name} poza Twoim gospodarstwem - pominięto")
+            elif row.tag_id in outside:
+                errors.append(f"Arkus_ {row.sheet}, Wiersz {row.row_number} (Tag: {row.tag_id}): Krowa należy do innego gospodarstwa - pominięto")
+            else: yield row
+
+
+def resolve_parents(dam_tag, sire_tag, known):
+    # known: tag -> wartość (id lub tag). Gdy znamy choć jednego rodzica, ustawiamy
+    # oboje (nieznany = None); gdy żadnego - rodowodu nie ruszamy (zwraca None)
+    dam = known.get(dam_tag) if dam_tag else None
+    sire = known.get(sire_tag) if sire_tag else None
+    return (dam, sire) if dam or sire else None
+
+
+def publish_cow(cow, op, now):
+    # bulk_create/bulk_update nie wysyłają sygnałów - strumień zmian zasilamy ręcznie
+    database = cow._state.db
+    transaction.on_commit(partial(changefeed.publish, 'cow', cow.id, op, cow.updated_at or now, herd_id=cow.herd_id, database=database), using=database)
+
+
+# === ZAPIS PACZKAMI ===
+class CowBatchWriter:
+    def __init__(self, errors, scope=None):
+        self.errors = errors; self.scope = scope; self.created = 0; self.updated = 0
+        self.herds = {}; self.parent_links = {}; self.now = timezone.now()
+
+    def herd(self, name):
+        if name not in self.herds: self.herds[name], _ = Herd.objects.get_or_create(name=name)
+        return self.herds[name]
+
+    def write(self, batch):
+        # Ten sam tag dwa razy w paczce: wygrywa późniejszy wiersz (jak przy update_or_create)
+        rows = {}
+        for row in batch: rows.pop(row.tag_id, None); rows[row.tag_id] = row
+        # Stada utworzone w wycofanym savepoincie znikają z bazy - także z pamięci
+        herds = dict(self.herds)
+        try:
+            with transaction.atomic(using=tenancy.write_database()):
+                saved = self._write_bulk(list(rows.values()))
+        except Exception as e:
+            self.herds = herds
+            logger.warning(f"Import: zapis paczki nie powiódł się ({str(e)}), zapisuję wiersz po wierszu")
+            saved = self._write_rows(list(rows.values()))
+        for row, cow_id in saved:
+            if row.dam_tag or row.sire_tag: self.parent_links[cow_id] = (row.dam_tag, row.sire_tag)
+
+    def _write_bulk(self, rows):
+        existing = Cow.objects.in_bulk([row.tag_id for row in rows], field_name='tag_id')
+        to_create = []; to_update = []; update_fields = set(); saved = []; moved = []
+        for row in rows:
+            fields = {**row.fields, 'herd': self.herd(row.herd_name)}
+            cow = existing.get(row.tag_id)
+            if cow is None:
+                cow = Cow(tag_id=row.tag_id, **fields); to_create.append((row, cow))
+            else:
+                if cow.herd_id != fields['herd'].pk: moved.append(cow.pk)
+                for name, value in fields.items(): setattr(cow, name, value)
+                cow.updated_at = self.now; update_fields.update(fields); to_update.append((row, cow))
+        if to_create:
+            Cow.objects.bulk_create([cow for _, cow in to_create])
+        if to_update:
+            Cow.objects.bulk_update([cow for _, cow in to_update], sorted(update_fields | {'updated_at'}))
+        tenancy.cow_herds_changed(moved)
+        self.created += len(to_create); self.updated += len(to_update)
+        for op, pairs in (('create', to_create), ('update', to_update)):
+            for row, cow in pairs:
+                saved.append((row, cow.id)); publish_cow(cow, op, self.now)
+        return saved
+
+    def _write_rows(self, rows):
+        saved = []
+        for row in rows:
+            herds = dict(self.herds)
+            try:
+                with transaction.atomic(using=tenancy.write_database()):
+                    cow, created = Cow.objects.update_or_create(
+                        tag_id=row.tag_id, defaults={**row.fields, 'herd': self.herd(row.herd_name)}
+                    )
+                if created: self.created += 1
+                else: self.updated += 1
+                saved.append((row, cow.id))
+            except Exception as e:
+                self.herds = herds
+                self.errors.append(f"Arkus_ {row.sheet}, Wiersz {row.row_number} (Tag: {row.tag_id}): Błąd zapisu - {str(e)}")
+        return saved
+
+    def link_parents(self, batch_size):
+        logger.info("Import: Rozpoczynam łączenie rodziców...")
+        all_parent_tags = {tag for tags in self.parent_links.values() for tag in tags if tag}
+        parents_in_db = dict(tenancy.scope_queryset(Cow.objects.filter(tag_id__in=all_parent_tags), self.scope).values_list('tag_id', 'id'))
+        linked = []
+        for cow_id, (dam_tag, sire_tag) in self.parent_links.items():
+            parents = resolve_parents(dam_tag, sire_tag, parents_in_db)
+            if parents: linked.append(Cow(id=cow_id, dam_id=parents[0], sire_id=parents[1]))
+        affected_parents = set(parents_in_db.values())
+        for chunk in batched(linked, batch_size):
+            # Dawni rodzice też tracą potomka - ich liczniki przeliczamy razem z nowymi
+            affected_parents.update(p for pair in Cow.objects.filter(id__in=[c.id for c in chunk]).values_list('dam_id', 'sire_id') for p in pair)
+            Cow.objects.bulk_update(chunk, ['dam', 'sire'])
+        pedigree.parents_changed([cow.id for cow in linked], affected_parents)
+        return linked
+
+    def result(self):
+        return {"created": self.created, "updated": self.updated, "errors": self.errors}
+
+
+def import_workbook(file, batch_size=None, scope=None):
+    # Zwraca {"created", "updated", "errors"}; błąd krytyczny przerywa całą transakcję
+    # scope: zakres użytkownika (tenancy.TenantScope), None = bez ograniczeń
+    batch_size = batch_size or getattr(settings, 'IMPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    errors = []; writer = CowBatchWriter(errors, scope)
+    with transaction.atomic(using=tenancy.write_database()):
+        for batch in batched(scoped_rows(read_rows(file, errors), scope, errors), batch_size):
+            writer.write(batch)
+        writer.link_parents(batch_size)
+    return writer.result()
+
+
+# === IMPORT "NA SUCHO": PODGLĄD RÓŻNIC I ZATWIERDZENIE ===
+# Podgląd czyta plik raz, pobiera obecne krowy jednym zapytaniem i zapisuje
+# różnice per krowa i pole w ImportPreview. Zatwierdzenie wykonuje dokładnie
+# te różnice (bez ponownego czytania pliku); krowy zmienione w międzyczasie
+# są pomijane z błędem.
+PREVIEW_FIELDS = ['name', 'gender', 'status'] + STRING_FIELDS + DATE_FIELDS + FLOAT_FIELDS
+RELATION_FIELDS = ['herd', 'dam', 'sire']  # w podglądzie jako nazwa stada / NR ARIMR rodzica
+
+
+def _to_python(name, value):
+    if name in RELATION_FIELDS or value is None: return value
+    field = Cow._meta.get_field(name); value = field.to_python(value)
+    if field.get_internal_type() == 'DecimalField':
+        value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+    return value
+
+
+def _current_values(cow):
+    values = {name: getattr(cow, name) for name in PREVIEW_FIELDS}
+    values.update({
+        'herd': cow.herd.name if cow.herd else None,
+        'dam': cow.dam.tag_id if cow.dam else None, 'sire': cow.sire.tag_id if cow.sire else None,
+    })
+    return values
+
+
+def build_preview(file, scope=None):
+    # Zwraca (summary, entries, errors); niczego nie zapisuje
+    errors = []; rows = {}
+    for row in scoped_rows(read_rows(file, errors), scope, errors): rows.pop(row.tag_id, None); rows[row.tag_id] = row
+    parent_tags = {tag for row in rows.values() for tag in (row.dam_tag, row.sire_tag) if tag}
+    current = {
+        cow.tag_id: cow for cow in
+        tenancy.scope_queryset(Cow.objects.filter(tag_id__in=set(rows) | parent_tags), scope).select_related('herd', 'dam', 'sire')
+    }
+    known = {tag: tag for tag in set(current) | set(rows)}
+    summary = {'rows': len(rows), 'new': 0, 'changed': 0, 'unchanged': 0, 'unresolved_parents': 0, 'errors': len(errors)}
+    entries = []
+    for row in rows.values():
+        cow = current.get(row.tag_id)
+        new_values = {**row.fields, 'herd': row.herd_name}
+        parents = resolve_parents(row.dam_tag, row.sire_tag, known)
+        if parents: new_values['dam'], new_values['sire'] = parents
+        old_values = _current_values(cow) if cow else {}
+        changes = {
+            name: {'old': old_values.get(name), 'new': value} for name, value in new_values.items()
+            if cow is None or _to_python(name, value) != old_values.get(name)
+        }
+        unresolved = [tag for tag in (row.dam_tag, row.sire_tag) if tag and tag not in known]
+        kind = 'new' if cow is None else 'changed' if changes else 'unchanged'
+        summary[kind] += 1
+        if unresolved: summary['unresolved_parents'] += 1
+        entries.append({
+            'tag_id': row.tag_id, 'sheet': row.sheet, 'row': row.row_number, 'kind': kind,
+            'cow_id': cow.id if cow else None,
+            'updated_at': cow.updated_at.isoformat() if cow else None,  # do wykrycia zmian po podglądzie
+            'changes': changes, 'unresolved_parents': unresolved,
+        })
+    return summary, entries, errors
+
+
+def create_preview(file, user=None, scope=None):
+    summary, entries, errors = build_preview(file, scope)
+    return ImportPreview.objects.create(
+        file_name=getattr(file, 'name', '') or '', summary=summary, entries=entries, errors=errors, user=user,
+    )
+
+
+def apply_preview(preview_id, batch_size=None):
+    # Zwraca {"created", "updated", "errors"}; ValueError gdy podgląd już zatwierdzono
+    batch_size = batch_size or getattr(settings, 'IMPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    now = timezone.now(); errors = []
+    with transaction.atomic(using=tenancy.write_database()):
+        preview = ImportPreview.objects.select_for_update().get(pk=preview_id)
+        if preview.status != 'PENDING':
+            raise ValueError(f"Podgląd {preview.pk} został już zatwierdzony.")
+        entries = [entry for entry in preview.entries if entry['kind'] != 'unchanged']
+        herd_names = {entry['changes']['herd']['new'] for entry in entries if 'herd' in entry['changes']}
+        herds = {name: Herd.objects.get_or_create(name=name)[0] for name in herd_names}
+        existing = Cow.objects.in_bulk([entry['tag_id'] for entry in entries], field_name='tag_id')
+        to_create = []; to_update = []; update_fields = set(); parent_links = []; moved = []
+        for entry in entries:
+            tag_id = entry['tag_id']; cow = existing.get(tag_id)
+            values = {name: change['new'] for name, change in entry['changes'].items()}
+            parents = {name: values.pop(name) for name in ('dam', 'sire') if name in values}
+            if 'herd' in values: values['herd'] = herds[values['herd']]
+            values = {name: _to_python(name, value) for name, value in values.items()}
+            if entry['kind'] == 'new':
+                if cow is not None:
+                    errors.append(f"Arkus_ {entry['sheet']}, Wiersz {entry['row']} (Tag: {tag_id}): Krowa została dodana po podglądzie")
+                    continue
+                cow = Cow(tag_id=tag_id, **values); to_create.append(cow)
+            else:
+                if cow is None or cow.updated_at.isoformat() != entry['updated_at']:
+                    errors.append(f"Arkus_ {entry['sheet']}, Wiersz {entry['row']} (Tag: {tag_id}): Krowa zmieniona po podglądzie - pominięto")
+                    continue
+                if 'herd' in values and cow.herd_id != values['herd'].pk: moved.append(cow.pk)
+                for name, value in values.items(): setattr(cow, name, value)
+                cow.updated_at = now; update_fields.update(values); to_update.append(cow)
+            if parents: parent_links.append((cow, parents))
+
+        Cow.objects.bulk_create(to_create, batch_size=batch_size)
+        if to_update:
+            Cow.objects.bulk_update(to_update, sorted(update_fields | {'updated_at'}), batch_size=batch_size)
+        tenancy.cow_herds_changed(moved)
+        if parent_links:
+            logger.info("Import: Rozpoczynam łączenie rodziców...")
+            parent_tags = {tag for _, parents in parent_links for tag in parents.values() if tag}
+            parent_ids = dict(Cow.objects.filter(tag_id__in=parent_tags).values_list('tag_id', 'id'))
+            affected_parents = set(parent_ids.values())
+            for cow, parents in parent_links:
+                affected_parents.update((cow.dam_id, cow.sire_id))
+                for name, tag in parents.items(): setattr(cow, f'{name}_id', parent_ids.get(tag) if tag else None)
+            Cow.objects.bulk_update([cow for cow, _ in parent_links], ['dam', 'sire'], batch_size=batch_size)
+            pedigree.parents_changed([cow.id for cow, _ in parent_links], affected_parents)
+        for op, cows in (('create', to_create), ('update', to_update)):
+            for cow in cows: publish_cow(cow, op, now)
+
+        preview.status = 'APPLIED'; preview.applied_at = now
+        preview.save(update_fields=['status', 'applied_at'])
+    return {"created": len(to_create), "updated": len(to_update), "errors": errors}
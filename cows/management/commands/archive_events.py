@@ -0,0 +1,44 @@
+# cows/management/commands/archive_events.py
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cows.archive import archive_cutoff, archive_events, get_setting
+from cows.tenancy import tenant_database, tenant_databases
+from cows.models import Event
+
+
+class Command(BaseCommand):
+    help = "Przenosi stare zdarzenia (starsze niż ARCHIVE['EVENT_HORIZON_DAYS']) do archiwum, paczkami."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon-days', type=int, help="Archiwizuj zdarzenia starsze niż tyle dni (domyślnie z ustawień)")
+        parser.add_argument('--before', help="Archiwizuj zdarzenia sprzed tej daty (RRRR-MM-DD), zamiast --horizon-days")
+        parser.add_argument('--batch-size', type=int, help="Wierszy na transakcję (domyślnie ARCHIVE['BATCH_SIZE'])")
+        parser.add_argument('--max-batches', type=int, help="Zatrzymaj po tylu paczkach (reszta przy kolejnym uruchomieniu)")
+        parser.add_argument('--pause', type=float, default=0, help="Przerwa między paczkami w sekundach")
+        parser.add_argument('--dry-run', action='store_true', help="Tylko policz zdarzenia do przeniesienia")
+        parser.add_argument('--database', help="Osobna baza gospodarstwa (alias z TENANCY['DATABASES'])")
+
+    def handle(self, *args, **options):
+        if options['database'] and options['database'] not in tenant_databases():
+            raise CommandError(f"Nieznana baza gospodarstwa: {options['database']}")
+        with tenant_database(options['database']):
+            self.archive(options)
+
+    def archive(self, options):
+        if options['before']:
+            try: cutoff = date.fromisoformat(options['before'])
+            except ValueError: raise CommandError(f"Nieprawidłowa data: {options['before']}")
+        else:
+            cutoff = archive_cutoff(options['horizon_days'])
+        pending = Event.objects.filter(date__lt=cutoff).count()
+        self.stdout.write(f"Zdarzenia sprzed {cutoff} do przeniesienia: {pending}")
+        if options['dry_run'] or not pending: return
+
+        batch_size = options['batch_size'] or get_setting('BATCH_SIZE')
+        def progress(batches, moved, total):
+            self.stdout.write(f"  paczka {batches}: {moved} (łącznie {total}/{pending})")
+        total = archive_events(cutoff, batch_size, options['max_batches'], options['pause'], progress)
+        self.stdout.write(self.style.SUCCESS(f"Przeniesiono do archiwum {total} zdarzeń."))
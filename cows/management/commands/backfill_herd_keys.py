@@ -0,0 +1,39 @@
+# cows/management/commands/backfill_herd_keys.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cows.models import Herd, Task
+from cows.tenancy import BATCH_SIZE, backfill_herd_keys, tenant_database, tenant_databases
+
+
+class Command(BaseCommand):
+    help = (
+        "Uzupełnia kopię stada (klucz najemcy) w zdarzeniach, archiwum i zadaniach ze stada krowy. "
+        "Wymagane po wdrożeniu wielu gospodarstw - dla każdej bazy (default i --database)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Krów na transakcję")
+        parser.add_argument('--task-herd', type=int, help="Id stada dla zadań bez krowy i bez stada")
+        parser.add_argument('--database', help="Osobna baza gospodarstwa (alias z TENANCY['DATABASES'])")
+
+    def handle(self, *args, **options):
+        if options['database'] and options['database'] not in tenant_databases():
+            raise CommandError(f"Nieznana baza gospodarstwa: {options['database']}")
+        with tenant_database(options['database']):
+            self.backfill(options)
+
+    def backfill(self, options):
+        task_herd = None
+        if options['task_herd'] is not None:
+            task_herd = Herd.objects.filter(pk=options['task_herd']).first()
+            if task_herd is None: raise CommandError(f"Nie ma stada o id {options['task_herd']}")
+        totals = backfill_herd_keys(options['batch_size'], task_herd)
+        for model, count in totals.items():
+            self.stdout.write(f"{model._meta.verbose_name_plural}: zaktualizowano {count}")
+        orphans = Task.objects.filter(cow__isnull=True, herd__isnull=True).count()
+        if orphans:
+            self.stdout.write(self.style.WARNING(
+                f"{orphans} zadań bez krowy i bez stada widzą tylko użytkownicy bez ograniczeń - przypisz je przez --task-herd"
+            ))
+        self.stdout.write(self.style.SUCCESS("Klucz najemcy uzupełniony."))
@@ -0,0 +1,74 @@
+# cows/management/commands/benchmark.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from cows.benchmarks.generator import HerdGenerator
+from cows.benchmarks.runner import (
+    BASELINES_PATH, SCENARIOS, BenchmarkContext, compare, load_baselines, measure, save_baselines,
+)
+
+
+class Command(BaseCommand):
+    help = "Uruchamia benchmarki (lista, skaner, statystyki, rodowód, import, sync) na syntetycznym stadzie w tymczasowej bazie."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cows', type=int, default=2000, help="Liczba krów w wygenerowanym stadzie")
+        parser.add_argument('--herds', type=int, default=4)
+        parser.add_argument('--generations', type=int, default=6)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--import-rows', type=int, default=10000, help="Liczba wierszy w skoroszycie importu")
+        parser.add_argument('--sync-jobs', type=int, default=1000, help="Liczba zadań w paczce synchronizacji")
+        parser.add_argument('--scenario', action='append', help="Uruchom tylko wybrane scenariusze (można powtarzać)")
+        parser.add_argument('--baseline', default=str(BASELINES_PATH), help="Plik z wynikami bazowymi")
+        parser.add_argument('--save-baseline', action='store_true', help="Zapisz bieżące wyniki jako bazowe")
+        parser.add_argument('--tolerance', type=float, default=0.25, help="Dopuszczalny wzrost czasu/pamięci (0.25 = 25%%)")
+        parser.add_argument('--fail-on-regression', action='store_true', help="Zakończ błędem przy regresji")
+
+    def handle(self, *args, **options):
+        scenarios = [s for s in SCENARIOS if not options['scenario'] or s.name in options['scenario']]
+        if not scenarios: raise CommandError(f"Nieznane scenariusze: {options['scenario']}")
+        params = {k: options[k] for k in ('cows', 'herds', 'generations', 'seed', 'import_rows', 'sync_jobs')}
+
+        # Benchmark nigdy nie dotyka bazy produkcyjnej: default to baza testowa, a replika,
+        # dołączone archiwum i bazy gospodarstw są wyłączone (routery czytają ustawienia
+        # przy każdym zapytaniu, więc wszystko idzie do bazy testowej)
+        isolated = override_settings(
+            READ_REPLICA={**getattr(settings, 'READ_REPLICA', {}), 'ALIAS': None},
+            ARCHIVE={**getattr(settings, 'ARCHIVE', {}), 'ATTACH_DATABASE': None},
+            TENANCY={**getattr(settings, 'TENANCY', {}), 'DATABASES': []},
+        )
+        isolated.enable(); setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            generator = HerdGenerator(
+                seed=options['seed'], cows=options['cows'], herds=options['herds'], generations=options['generations'],
+            )
+            self.stdout.write(f"Generowanie stada: {options['cows']} krów, {options['herds']} stada, {options['generations']} pokoleń...")
+            ctx = BenchmarkContext(generator, generator.build(), options)
+            results = {}
+            for scenario in scenarios:
+                self.stdout.write(f"  {scenario.name}...", ending=''); self.stdout.flush()
+                results[scenario.name] = measure(scenario, ctx)
+                r = results[scenario.name]
+                self.stdout.write(f" {r['median_ms']} ms (p95 {r['p95_ms']} ms), {r['queries']} zapytań, {r['peak_kb']} KB")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment(); isolated.disable()
+
+        baselines = load_baselines(options['baseline'])
+        if baselines.get('params') and baselines['params'] != params:
+            self.stdout.write(self.style.WARNING(f"Wyniki bazowe zebrano dla innych parametrów: {baselines['params']}"))
+        regressions = compare(results, baselines, options['tolerance'])
+        for name, metric, base, current in regressions:
+            self.stdout.write(self.style.ERROR(f"REGRESJA {name}.{metric}: {base} -> {current}"))
+        if not regressions and baselines:
+            self.stdout.write(self.style.SUCCESS("Brak regresji względem wyników bazowych."))
+
+        if options['save_baseline']:
+            save_baselines(results, params, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Zapisano wyniki bazowe: {options['baseline']}"))
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f"Wykryto {len(regressions)} regresji wydajności.")
@@ -0,0 +1,53 @@
+# cows/management/commands/build_reports.py
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cows.models import Herd
+from cows.reports import KINDS, build_reports, month_period, previous_month
+from cows.tenancy import tenant_database, tenant_databases
+
+
+class Command(BaseCommand):
+    help = "Buduje raporty ARiMR (księga rejestracji, zdarzenia) dla stad i okresu; bez zmian w danych zostawia ostatnią wersję."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help="Miesiąc RRRR-MM (domyślnie poprzedni)")
+        parser.add_argument('--start', help="Początek okresu RRRR-MM-DD (z --end, zamiast --month)")
+        parser.add_argument('--end', help="Koniec okresu RRRR-MM-DD")
+        parser.add_argument('--herd', action='append', help="Nazwa stada (można powtórzyć; domyślnie wszystkie)")
+        parser.add_argument('--kind', choices=KINDS, action='append', help="Rodzaj raportu (domyślnie oba)")
+        parser.add_argument('--force', action='store_true', help="Buduj nową wersję nawet bez zmian w danych")
+        parser.add_argument('--database', help="Osobna baza gospodarstwa (alias z TENANCY['DATABASES'])")
+
+    def handle(self, *args, **options):
+        if options['database'] and options['database'] not in tenant_databases():
+            raise CommandError(f"Nieznana baza gospodarstwa: {options['database']}")
+        with tenant_database(options['database']):
+            self.build(options)
+
+    def build(self, options):
+        try:
+            if options['start'] or options['end']:
+                start, end = date.fromisoformat(options['start'] or ''), date.fromisoformat(options['end'] or '')
+            elif options['month']:
+                start, end = month_period(options['month'])
+            else:
+                start, end = previous_month()
+        except ValueError as e:
+            raise CommandError(f"Nieprawidłowy okres: {e}")
+        if start > end: raise CommandError("Początek okresu jest po jego końcu")
+
+        herds = Herd.objects.all()
+        if options['herd']:
+            herds = herds.filter(name__in=options['herd'])
+            missing = set(options['herd']) - set(herds.values_list('name', flat=True))
+            if missing: raise CommandError(f"Nieznane stada: {', '.join(sorted(missing))}")
+
+        built = 0
+        for report, is_new in build_reports(start, end, herds, options['kind'], options['force']):
+            built += is_new
+            state = f"nowa wersja v{report.version}" if is_new else f"bez zmian (v{report.version})"
+            self.stdout.write(f"  {report.herd} / {report.kind}: {state}, {report.row_count} wierszy")
+        self.stdout.write(self.style.SUCCESS(f"Okres {start} - {end}: zbudowano {built} raportów."))
@@ -0,0 +1,20 @@
+# cows/management/commands/rebuild_pedigree.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cows.pedigree import rebuild_all
+from cows.tenancy import tenant_database, tenant_databases
+
+
+class Command(BaseCommand):
+    help = "Przelicza od nowa liczniki potomstwa i tabelę domknięcia rodowodu (np. po wdrożeniu)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', help="Osobna baza gospodarstwa (alias z TENANCY['DATABASES'])")
+
+    def handle(self, *args, **options):
+        if options['database'] and options['database'] not in tenant_databases():
+            raise CommandError(f"Nieznana baza gospodarstwa: {options['database']}")
+        with tenant_database(options['database']):
+            counts, rows = rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f"Przeliczono liczniki {counts} krów, rodowód: {rows} par przodek-potomek."))
@@ -0,0 +1,24 @@
+# cows/management/commands/refresh_replica_snapshot.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cows.replicas import refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = "Odświeża kopię bazy SQLite używaną jako replika (READ_REPLICA['ALIAS']) przez online backup API."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, help="Powtarzaj co tyle sekund (bez - jedno odświeżenie)")
+        parser.add_argument('--pages', type=int, help="Stron na krok kopii (domyślnie READ_REPLICA['SNAPSHOT_PAGES'])")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            try: path = refresh_snapshot(pages=options['pages'])
+            except ValueError as e: raise CommandError(str(e))
+            self.stdout.write(f"Odświeżono {path} w {time.monotonic() - started:.2f} s")
+            if not options['every']: return
+            time.sleep(max(options['every'] - (time.monotonic() - started), 0))
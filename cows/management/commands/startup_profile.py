@@ -0,0 +1,72 @@
+# cows/management/commands/startup_profile.py
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Moduły, których nie chcemy ładować przy starcie workera
+HEAVY_MODULES = ['pandas', 'numpy', 'openpyxl', 'PIL.Image']
+
+# Uruchamiane w świeżym interpreterze: to samo, co robi worker gunicorna
+# przy starcie (aplikacja WSGI + URLconf), plus pomiar czasu i RSS.
+PROBE = """
+import json, os, resource, sys, time
+started = time.perf_counter()
+os.environ['DJANGO_SETTINGS_MODULE'] = {settings_module!r}
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - started
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin': rss //= 1024
+print(json.dumps({{'seconds': elapsed, 'rss_kb': rss, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Mierzy czas startu procesu (WSGI + URLconf), szczytowy RSS i ciężkie moduły ładowane przy starcie."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="Liczba pomiarów (świeże procesy)")
+        parser.add_argument('--importtime', action='store_true', help="Pokaż moduły o najdłuższym czasie importu")
+        parser.add_argument('--top', type=int, default=15)
+
+    def handle(self, *args, **options):
+        code = PROBE.format(settings_module=settings.SETTINGS_MODULE, heavy=HEAVY_MODULES)
+        env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get('PYTHONPATH')]))}
+        samples = []
+        for _ in range(max(options['runs'], 1)):
+            samples.append(self._probe(code, env))
+        seconds = [s['seconds'] * 1000 for s in samples]; rss = [s['rss_kb'] / 1024 for s in samples]
+        self.stdout.write(f"Start procesu: mediana {statistics.median(seconds):.0f} ms (min {min(seconds):.0f}, max {max(seconds):.0f}), {len(samples)} pomiarów")
+        self.stdout.write(f"Szczytowy RSS: mediana {statistics.median(rss):.1f} MB")
+        loaded = samples[-1]['loaded']
+        if loaded:
+            self.stdout.write(self.style.WARNING(f"Ciężkie moduły ładowane przy starcie: {', '.join(loaded)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Żaden z ciężkich modułów nie jest ładowany przy starcie."))
+        if options['importtime']: self._importtime(code, env, options['top'])
+
+    def _probe(self, code, env, extra_args=()):
+        result = subprocess.run([sys.executable, *extra_args, '-c', code], capture_output=True, text=True, env=env)
+        if result.returncode != 0: raise CommandError(f"Pomiar startu nie powiódł się:\n{result.stderr[-2000:]}")
+        return json.loads(result.stdout.strip().splitlines()[-1]) if not extra_args else result
+
+    def _importtime(self, code, env, top):
+        # -X importtime: "import time: self [us] | cumulative | imported package"
+        result = self._probe(code, env, extra_args=('-X', 'importtime'))
+        rows = []
+        for line in result.stderr.splitlines():
+            parts = line.split('|')
+            if len(parts) != 3 or not line.startswith('import time:'): continue
+            try: rows.append((int(parts[1]), parts[2].rstrip()))
+            except ValueError: continue
+        self.stdout.write(f"Najdłuższe importy (łącznie z zależnościami):")
+        for cumulative, module in sorted(rows, reverse=True)[:top]:
+            self.stdout.write(f"  {cumulative / 1000:8.1f} ms  {module}")
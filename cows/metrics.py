@@ -0,0 +1,151 @@
+# cows/metrics.py
+
+# === METRYKI WYDAJNOŚCI (format tekstowy Prometheusa) ===
+# Rejestr w pamięci procesu: histogramy czasu odpowiedzi per widok, liczba i
+# czas zapytań SQL, rozmiar odpowiedzi, próbki wolnych zapytań i czasy zadań
+# SyncView per akcja. Zapytania liczy wrapper podpinany do każdego połączenia
+# DB, a przypisuje je do żądania przez contextvar (działa też pod ASGI).
+
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+
+def get_setting(name, default):
+    return getattr(settings, 'METRICS', {}).get(name, default)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets; self.counts = [0] * len(buckets); self.total = 0; self.sum = 0.0
+
+    def observe(self, value):
+        self.total += 1; self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound: self.counts[i] += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.request_duration = defaultdict(lambda: Histogram(DEFAULT_BUCKETS))
+            self.request_queries = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+            self.requests_total = defaultdict(int)
+            self.query_seconds_total = defaultdict(float)
+            self.response_bytes_total = defaultdict(int)
+            self.slow_queries_total = defaultdict(int)
+            self.sync_job_duration = defaultdict(lambda: Histogram(DEFAULT_BUCKETS))
+            self.slow_query_samples = deque(maxlen=get_setting('SLOW_QUERY_SAMPLES', 50))
+
+    def observe_request(self, view, method, status, seconds, stats, response_bytes):
+        with self._lock:
+            self.request_duration[(view, method)].observe(seconds)
+            self.request_queries[(view, method)].observe(stats.queries)
+            self.requests_total[(view, method, str(status))] += 1
+            self.query_seconds_total[(view,)] += stats.query_seconds
+            if response_bytes is not None: self.response_bytes_total[(view,)] += response_bytes
+
+    def observe_slow_query(self, view, sql, seconds):
+        with self._lock:
+            self.slow_queries_total[(view,)] += 1
+            self.slow_query_samples.append({
+                'view': view, 'sql': sql[:2000], 'seconds': round(seconds, 4), 'at': timezone.now().isoformat(),
+            })
+
+    def observe_sync_job(self, action, status, seconds):
+        with self._lock: self.sync_job_duration[(str(action), str(status))].observe(seconds)
+
+    def slow_queries(self):
+        with self._lock: return list(self.slow_query_samples)
+
+    # === Eksport w formacie tekstowym Prometheusa ===
+    def render(self):
+        lines = []
+        with self._lock:
+            _histogram(lines, 'highlander_http_request_duration_seconds', 'Czas obsługi żądania', ('view', 'method'), self.request_duration)
+            _histogram(lines, 'highlander_http_request_db_queries', 'Liczba zapytań SQL na żądanie', ('view', 'method'), self.request_queries)
+            _counter(lines, 'highlander_http_requests_total', 'Liczba żądań', ('view', 'method', 'status'), self.requests_total)
+            _counter(lines, 'highlander_db_query_seconds_total', 'Łączny czas zapytań SQL', ('view',), self.query_seconds_total)
+            _counter(lines, 'highlander_http_response_bytes_total', 'Łączny rozmiar odpowiedzi', ('view',), self.response_bytes_total)
+            _counter(lines, 'highlander_db_slow_queries_total', 'Liczba wolnych zapytań SQL', ('view',), self.slow_queries_total)
+            _histogram(lines, 'highlander_sync_job_duration_seconds', 'Czas zadania SyncView', ('action', 'status'), self.sync_job_duration)
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+def _counter(lines, name, help_text, label_names, values):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+    for key, value in sorted(values.items()):
+        lines.append(f'{name}{_labels(label_names, key)} {value}')
+
+
+def _histogram(lines, name, help_text, label_names, histograms):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for key, hist in sorted(histograms.items()):
+        for bound, count in zip(hist.buckets, hist.counts):
+            lines.append(f'{name}_bucket{_labels(label_names, key, [("le", bound)])} {count}')
+        lines.append(f'{name}_bucket{_labels(label_names, key, [("le", "+Inf")])} {hist.total}')
+        lines.append(f'{name}_sum{_labels(label_names, key)} {hist.sum}')
+        lines.append(f'{name}_count{_labels(label_names, key)} {hist.total}')
+
+
+registry = Registry()
+
+
+# === LICZNIK ZAPYTAŃ DLA BIEŻĄCEGO ŻĄDANIA ===
+class RequestStats:
+    def __init__(self, parent=None):
+        # parent: zewnętrzny licznik (np. benchmark), który też widzi te zapytania
+        self.queries = 0; self.query_seconds = 0.0; self.view = 'unresolved'; self.parent = parent
+
+
+_current_stats = contextvars.ContextVar('highlander_request_stats', default=None)
+
+
+def start_collecting():
+    stats = RequestStats(parent=_current_stats.get()); return stats, _current_stats.set(stats)
+
+
+def stop_collecting(token):
+    _current_stats.reset(token)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        stats = _current_stats.get()
+        view = stats.view if stats else 'background'
+        collector = stats
+        while collector is not None:
+            collector.queries += 1; collector.query_seconds += duration; collector = collector.parent
+        if duration >= get_setting('SLOW_QUERY_SECONDS', 0.2):
+            registry.observe_slow_query(view, sql, duration)
+            logger.warning(f"Wolne zapytanie ({duration:.3f}s, {view}): {sql[:500]}")
+
+
+def install_query_wrapper(sender=None, connection=None, **kwargs):
+    # Podpinane przy connection_created; lista wrapperów żyje z obiektem połączenia
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
@@ -0,0 +1,116 @@
+# cows/middleware.py
+
+import cProfile
+import logging
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from . import metrics
+from .authentication import CachedJWTAuthentication
+
+logger = logging.getLogger(__name__)
+
+
+# === METRYKI I PROFILOWANIE ŻĄDAŃ ===
+# Działa zarówno pod WSGI, jak i ASGI (bez przełączania na wątki).
+# Profil (nagłówek X-Profile, tylko administratorzy) startuje w process_view
+# i kończy się po get_response - widok przechodzi przez pozostałe middleware
+# (m.in. CSRF), a nie jest wywoływany stąd z ich pominięciem.
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response): markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self): return self.__acall__(request)
+        stats, token = metrics.start_collecting(); started = time.perf_counter(); response = None
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.stop_collecting(token)
+            profile = getattr(request, '_request_profile', None)
+            if profile is not None: profile.finish(request, response)
+        self._record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = metrics.start_collecting(); started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.stop_collecting(token)
+        self._record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = metrics._current_stats.get()
+        if stats: stats.view = _view_name(request)
+        header = getattr(settings, 'METRICS', {}).get('PROFILE_HEADER', 'X-Profile')
+        # Tylko WSGI i widoki sync - cProfile/pyinstrument widzą bieżący wątek
+        if request.headers.get(header) and not iscoroutinefunction(self) and not iscoroutinefunction(view_func) and _is_staff(request):
+            request._request_profile = RequestProfile()
+        return None
+
+    def _record(self, request, response, stats, seconds):
+        view = _view_name(request)
+        response_bytes = None if response.streaming else len(response.content)
+        metrics.registry.observe_request(view, request.method, response.status_code, seconds, stats, response_bytes)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None: return 'unresolved'
+    return match.view_name or match.route or 'unresolved'
+
+
+def _is_staff(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated: return user.is_staff
+    # Endpointy API używają JWT, którego middleware sesji nie widzi
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except (InvalidToken, AuthenticationFailed):
+        return False
+    return bool(result and result[0].is_staff)
+
+
+class RequestProfile:
+    # pyinstrument (raport HTML), a bez niego cProfile (.prof)
+    def __init__(self):
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            Profiler = None
+        self.profiler = Profiler() if Profiler is not None else cProfile.Profile()
+        if Profiler is not None: self.profiler.start()
+        else: self.profiler.enable()
+
+    def finish(self, request, response):
+        is_cprofile = isinstance(self.profiler, cProfile.Profile)
+        if response is not None: _render(response)
+        if is_cprofile: self.profiler.disable()
+        else: self.profiler.stop()
+        if response is None: return  # wyjątek - bez pliku
+        profile_dir = Path(getattr(settings, 'METRICS', {}).get('PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        name = f"{timezone.now():%Y%m%d-%H%M%S-%f}-{_view_name(request).replace(':', '_')}"
+        if is_cprofile:
+            path = profile_dir / f'{name}.prof'; self.profiler.dump_stats(path)
+        else:
+            path = profile_dir / f'{name}.html'; path.write_text(self.profiler.output_html(), encoding='utf-8')
+        logger.info(f"Zapisano profil żądania {request.path}: {path}")
+        response['X-Profile-File'] = path.name
+
+
+def _render(response):
+    # Odpowiedzi DRF renderują się leniwie - chcemy to mieć w profilu
+    if hasattr(response, 'render') and callable(response.render): response.render()
+    return response
@@ -1,11 +1,35 @@
 # cows/models.py
 from django.db import models
+from django.db.models import DEFERRED
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 import os
 
+class Farm(models.Model):
+    # Gospodarstwo (najemca). Zawsze w bazie default; jego stada i krowy - w bazie
+    # `database` (alias z TENANCY['DATABASES']) albo, gdy puste, też w default.
+    name = models.CharField(max_length=100, unique=True, verbose_name="Nazwa gospodarstwa")
+    database = models.CharField(max_length=100, blank=True, verbose_name="Osobna baza (alias)")
+
+    class Meta:
+        verbose_name = "Gospodarstwo"
+        verbose_name_plural = "Gospodarstwa"
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        from .tenancy import tenant_databases
+        if self.database and self.database not in tenant_databases():
+            raise ValidationError({'database': f"Alias spoza TENANCY['DATABASES']: {self.database}"})
+
 class Herd(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name="Nazwa stada")
     description = models.TextField(blank=True, null=True, verbose_name="Opis")
+    # Bez ograniczenia FK w bazie - przy osobnej bazie gospodarstwa Farm leży w default
+    farm = models.ForeignKey(Farm, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False, related_name='herds', verbose_name="Gospodarstwo")
     
     class Meta:
         verbose_name = "Stado"
@@ -25,7 +49,8 @@ class Cow(models.Model):
     ]
     
     # --- Identyfikacja i Stado ---
-    herd = models.ForeignKey(Herd, on_delete=models.SET_NULL, null=True, blank=True, related_name='cows', verbose_name="Stado")
+    # Stado to klucz najemcy: indeksy złożone w Meta zaczynają się od niego
+    herd = models.ForeignKey(Herd, on_delete=models.SET_NULL, null=True, blank=True, db_index=False, related_name='cows', verbose_name="Stado")
     tag_id = models.CharField(max_length=50, unique=True, verbose_name="NR ARIMR")
     name = models.CharField(max_length=100, verbose_name="NAZWA")
     passport_number = models.CharField(max_length=100, blank=True, null=True, verbose_name="NR PASZPORTU")
@@ -65,15 +90,46 @@ class Cow(models.Model):
     photo = models.ImageField(upload_to='cows/', blank=True, null=True, verbose_name="Zdjęcie (z aplikacji)")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    # --- Liczniki potomstwa (utrzymuje cows/pedigree.py, nie edytować ręcznie) ---
+    offspring_as_dam_count = models.PositiveIntegerField(default=0, db_index=True, editable=False, verbose_name="Potomstwo (jako matka)")
+    offspring_as_sire_count = models.PositiveIntegerField(default=0, db_index=True, editable=False, verbose_name="Potomstwo (jako ojciec)")
+    COUNTER_FIELDS = ('offspring_as_dam_count', 'offspring_as_sire_count')
     
     class Meta:
         verbose_name = "Krowa"
         verbose_name_plural = "Krowy"
         ordering = ['tag_id']
+        indexes = [ models.Index(fields=['herd', 'tag_id']), models.Index(fields=['herd', 'status']), ]
     
     def __str__(self):
         return f"{self.tag_id} - {self.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Zapamiętujemy rodziców z bazy - post_save przebudowuje rodowód tylko przy ich zmianie
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_parents = (instance.__dict__.get('dam_id', DEFERRED), instance.__dict__.get('sire_id', DEFERRED))
+        instance._loaded_herd = instance.__dict__.get('herd_id', DEFERRED)  # j.w. dla stada zdarzeń i zadań
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Zwykły zapis nie nadpisuje liczników potomstwa (mogły się zmienić od odczytu):
+        # pomijamy je tylko w UPDATE (_do_update), więc semantyka save() się nie zmienia -
+        # gdy wiersza już nie ma, Django robi INSERT jak dla każdego modelu
+        update_fields = kwargs.get('update_fields')
+        self._skip_counters = update_fields is None or not set(self.COUNTER_FIELDS) & set(update_fields)
+        super().save(*args, **kwargs)
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update, *args, **kwargs):
+        if getattr(self, '_skip_counters', True): values = [value for value in values if value[0].name not in self.COUNTER_FIELDS]
+        return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update, *args, **kwargs)
+
+def set_herd_from_cow(instance):
+    # Event/Task trzymają kopię stada krowy (zapytania najemcy bez JOIN-a z Cow);
+    # przy zmianie stada krowy kopie poprawia tenancy.cow_herds_changed
+    if instance.cow_id: instance.herd_id = instance.cow.herd_id
+
 class Event(models.Model):
     EVENT_TYPE_CHOICES = [
         ('LECZENIE', 'Leczenie'), ('SZCZEPIENIE', 'Szczepienie'),
@@ -85,12 +141,39 @@ class Event(models.Model):
     notes = models.TextField(blank=True, null=True, verbose_name="Notatki")
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Operator")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # wykrywanie zmian dla raportów (cows/reports.py)
+    herd = models.ForeignKey(Herd, on_delete=models.SET_NULL, null=True, blank=True, db_index=False, editable=False, related_name='+', verbose_name="Stado")  # kopia cow.herd (klucz najemcy)
     class Meta:
         ordering = ['-date', '-created_at'] 
         verbose_name = "Zdarzenie (Historia)"
         verbose_name_plural = "Zdarzenia (Historia)"
+        indexes = [ models.Index(fields=['cow', '-date']), models.Index(fields=['date']), models.Index(fields=['herd', '-date']), ]
     def __str__(self):
         return f"[{self.cow.name}] - {self.event_type} ({self.date})"
+    def save(self, *args, **kwargs):
+        set_herd_from_cow(self); super().save(*args, **kwargs)
+
+class ArchivedEvent(models.Model):
+    # Zdarzenia starsze niż ARCHIVE['EVENT_HORIZON_DAYS'] (patrz cows/archive.py).
+    # Te same kolumny i w tej samej kolejności co Event (UNION w historii), to samo id.
+    # Bez ograniczeń FK w bazie - tabela może leżeć w dołączonym pliku SQLite.
+    id = models.IntegerField(primary_key=True)
+    cow = models.ForeignKey(Cow, on_delete=models.CASCADE, db_constraint=False, related_name='archived_events', verbose_name="Krowa")
+    event_type = models.CharField(max_length=50, choices=Event.EVENT_TYPE_CHOICES, default='INNE', verbose_name="Typ zdarzenia")
+    date = models.DateField(verbose_name="Data zdarzenia")
+    notes = models.TextField(blank=True, null=True, verbose_name="Notatki")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, db_constraint=False, null=True, blank=True, related_name='+', verbose_name="Operator")
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField(null=True, blank=True)
+    herd = models.ForeignKey(Herd, on_delete=models.SET_NULL, db_constraint=False, null=True, blank=True, db_index=False, related_name='+', verbose_name="Stado")
+    archived_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        ordering = ['-date', '-created_at']
+        verbose_name = "Zdarzenie (Archiwum)"
+        verbose_name_plural = "Zdarzenia (Archiwum)"
+        indexes = [ models.Index(fields=['cow', '-date']), models.Index(fields=['date']), models.Index(fields=['herd', '-date']), ]
+    def __str__(self):
+        return f"[{self.cow_id}] - {self.event_type} ({self.date})"
 
 class CowDocument(models.Model):
     cow = models.ForeignKey(Cow, on_delete=models.CASCADE, related_name='documents', verbose_name="Krowa")
@@ -124,9 +207,89 @@ class Task(models.Model):
     is_completed = models.BooleanField(default=False, verbose_name="Wykonane", db_index=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Operator")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Klucz najemcy: przy zadaniu dla krowy kopia cow.herd, bez krowy - wybrane stado
+    herd = models.ForeignKey(Herd, on_delete=models.SET_NULL, null=True, blank=True, db_index=False, related_name='tasks', verbose_name="Stado")
     class Meta:
         ordering = ['due_date', 'created_at'] 
         verbose_name = "Zadanie (Kalendarz)"
         verbose_name_plural = "Zadania (Kalendarz)"
+        indexes = [ models.Index(fields=['herd', 'is_completed', 'due_date']), ]
     def __str__(self):
         return f"{self.title} (do {self.due_date})"
+    def save(self, *args, **kwargs):
+        set_herd_from_cow(self); super().save(*args, **kwargs)
+
+class CowLineage(models.Model):
+    # Tabela domknięcia rodowodu: para (przodek, potomek) z najkrótszą odległością
+    # (1 = rodzic). Utrzymywana przez cows/pedigree.py przy zmianie dam/sire.
+    ancestor = models.ForeignKey(Cow, on_delete=models.CASCADE, related_name='lineage_descendants', verbose_name="Przodek")
+    descendant = models.ForeignKey(Cow, on_delete=models.CASCADE, related_name='lineage_ancestors', verbose_name="Potomek")
+    depth = models.PositiveSmallIntegerField(verbose_name="Pokolenie")
+    class Meta:
+        verbose_name = "Rodowód (domknięcie)"
+        verbose_name_plural = "Rodowód (domknięcie)"
+        constraints = [ models.UniqueConstraint(fields=['descendant', 'ancestor'], name='cows_lineage_unique_pair'), ]
+        indexes = [ models.Index(fields=['ancestor', 'depth']), ]
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+class ImportPreview(models.Model):
+    # Wynik importu "na sucho": różnice wyliczone raz, zatwierdzane bez ponownego czytania pliku
+    STATUS_CHOICES = [ ('PENDING', 'Oczekuje'), ('APPLIED', 'Zatwierdzony'), ]
+    file_name = models.CharField(max_length=255, blank=True, verbose_name="Plik")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING', verbose_name="Status")
+    summary = models.JSONField(default=dict, verbose_name="Podsumowanie")
+    entries = models.JSONField(default=list, encoder=DjangoJSONEncoder, verbose_name="Różnice")
+    errors = models.JSONField(default=list, verbose_name="Błędy")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Operator")
+    created_at = models.DateTimeField(auto_now_add=True)
+    applied_at = models.DateTimeField(null=True, blank=True)
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Podgląd importu"
+        verbose_name_plural = "Podglądy importu"
+    def __str__(self):
+        return f"{self.file_name} ({self.created_at:%Y-%m-%d %H:%M})"
+
+def herd_report_upload_to(instance, filename):
+    return f"reports/{instance.herd_id}/{filename}"
+
+class HerdReport(models.Model):
+    # Raport ARiMR dla stada i okresu (cows/reports.py). Każda przebudowa to nowa
+    # wersja pliku; fingerprint opisuje dane źródłowe, z których powstał.
+    KIND_CHOICES = [ ('REGISTER', 'Księga rejestracji stada'), ('MOVEMENTS', 'Zdarzenia w okresie'), ]
+    herd = models.ForeignKey(Herd, on_delete=models.CASCADE, related_name='reports', verbose_name="Stado")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name="Rodzaj")
+    period_start = models.DateField(verbose_name="Od")
+    period_end = models.DateField(verbose_name="Do")
+    version = models.PositiveIntegerField(default=1, verbose_name="Wersja")
+    file = models.FileField(upload_to=herd_report_upload_to, verbose_name="Plik")
+    fingerprint = models.CharField(max_length=64, verbose_name="Odcisk danych")
+    row_count = models.PositiveIntegerField(default=0, verbose_name="Wiersze")
+    summary = models.JSONField(default=dict, verbose_name="Podsumowanie")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Operator")
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        ordering = ['-period_start', 'herd', 'kind', '-version']
+        verbose_name = "Raport ARiMR"
+        verbose_name_plural = "Raporty ARiMR"
+        constraints = [ models.UniqueConstraint(fields=['herd', 'kind', 'period_start', 'period_end', 'version'], name='cows_herdreport_unique_version'), ]
+    def __str__(self):
+        return f"{self.herd} {self.kind} {self.period_start}..{self.period_end} v{self.version}"
+    @property
+    def filename(self):
+        return os.path.basename(self.file.name)
+
+class FarmMembership(models.Model):
+    # Przypisanie użytkownika do gospodarstwa (herd puste) albo do jednego stada.
+    # Zawsze w bazie default, jak Farm (patrz cows/tenancy.py).
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='farm_memberships', verbose_name="Użytkownik")
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='memberships', verbose_name="Gospodarstwo")
+    # DO_NOTHING: stado może leżeć w innej bazie; wpis po usuniętym stadzie niczego nie odsłania
+    herd = models.ForeignKey(Herd, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False, related_name='+', verbose_name="Stado (puste = całe gospodarstwo)")
+    class Meta:
+        verbose_name = "Dostęp do gospodarstwa"
+        verbose_name_plural = "Dostęp do gospodarstw"
+        constraints = [ models.UniqueConstraint(fields=['user', 'farm', 'herd'], name='cows_farmmembership_unique'), ]
+    def __str__(self):
+        return f"{self.user} -> {self.farm}" + (f" / {self.herd_id}" if self.herd_id else "")
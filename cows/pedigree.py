@@ -0,0 +1,121 @@
+# cows/pedigree.py
+
+# === ZDENORMALIZOWANY RODOWÓD ===
+# Liczniki potomstwa (Cow.offspring_as_dam_count / offspring_as_sire_count)
+# i tabela domknięcia CowLineage (wszyscy przodkowie każdej krowy z odległością).
+# Przeliczane przy zmianie dam/sire: sygnał post_save (formularze, admin,
+# SyncView) oraz jawnie po zapisach hurtowych (import z Excela).
+# Listy potomstwa i filtry hodowlane to wtedy proste zapytania po indeksie.
+
+import logging
+from collections import defaultdict, deque
+
+from django.db import connections, router, transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from . import tenancy
+from .models import Cow, CowLineage
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def _count_subquery(parent_field):
+    children = Cow.objects.filter(**{parent_field: OuterRef('pk')}).order_by().values(parent_field)
+    return Coalesce(Subquery(children.annotate(n=Count('id')).values('n')), Value(0))
+
+
+def refresh_offspring_counts(parent_ids=None):
+    # Jedno UPDATE dla wszystkich wskazanych rodziców (None = całe stado), bez zmiany updated_at
+    queryset = Cow.objects.all()
+    if parent_ids is not None:
+        parent_ids = {pk for pk in parent_ids if pk}
+        if not parent_ids: return 0
+        queryset = queryset.filter(id__in=parent_ids)
+    return queryset.update(
+        offspring_as_dam_count=_count_subquery('dam'), offspring_as_sire_count=_count_subquery('sire'),
+    )
+
+
+def rebuild_lineage(cow_ids=None):
+    # Przelicza przodków wskazanych krów (None = całe stado) i wszystkich ich
+    # potomków; pozostałe wiersze domknięcia się nie zmieniają (przodkowie spoza
+    # poddrzewa są już policzeni)
+    cows = Cow.objects.all(); existing = CowLineage.objects.all()
+    if cow_ids is not None:
+        cow_ids = set(cow_ids)
+        if not cow_ids: return 0
+        subtree = cow_ids | set(CowLineage.objects.filter(ancestor_id__in=cow_ids).values_list('descendant_id', flat=True))
+        cows = cows.filter(id__in=subtree); existing = existing.filter(descendant_id__in=subtree)
+    parents = {pk: {dam, sire} - {None} for pk, dam, sire in cows.values_list('id', 'dam_id', 'sire_id')}
+    subtree = set(parents)  # usunięte krowy odpadają
+
+    ancestors = defaultdict(dict)
+    outside = {p for ps in parents.values() for p in ps if p not in subtree}
+    for descendant, ancestor, depth in CowLineage.objects.filter(descendant_id__in=outside).values_list('descendant_id', 'ancestor_id', 'depth'):
+        ancestors[descendant][ancestor] = depth
+
+    # Kolejność topologiczna w poddrzewie: najpierw rodzice, potem dzieci
+    children = defaultdict(list); waiting = {}
+    for pk, ps in parents.items():
+        inside = [p for p in ps if p in subtree]; waiting[pk] = len(inside)
+        for p in inside: children[p].append(pk)
+    queue = deque(pk for pk, n in waiting.items() if n == 0); rows = []; done = 0
+    while queue:
+        pk = queue.popleft(); merged = {}; done += 1
+        for p in parents[pk]:
+            for ancestor, depth in [(p, 0), *ancestors[p].items()]:
+                if ancestor != pk and depth + 1 < merged.get(ancestor, depth + 2): merged[ancestor] = depth + 1
+        ancestors[pk] = merged
+        rows += [(a, pk, d) for a, d in merged.items()]
+        for child in children[pk]:
+            waiting[child] -= 1
+            if waiting[child] == 0: queue.append(child)
+    if done < len(subtree):
+        logger.warning(f"Rodowód: cykl w relacjach rodzic-potomek, pominięto {len(subtree) - done} krów")
+
+    with transaction.atomic(using=tenancy.write_database()):
+        existing.delete()
+        _insert_lineage(rows)
+    return len(rows)
+
+
+def _insert_lineage(rows):
+    # Surowe executemany: przy imporcie to dziesiątki tysięcy krotek, a bulk_create
+    # budowałby dla każdej obiekt modelu
+    if not rows: return
+    connection = connections[router.db_for_write(CowLineage)]
+    table = connection.ops.quote_name(CowLineage._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            cursor.executemany(
+                f"INSERT INTO {table} (ancestor_id, descendant_id, depth) VALUES (%s, %s, %s)", rows[start:start + BATCH_SIZE]
+            )
+
+
+def parents_changed(cow_ids, parent_ids):
+    # parent_ids: dawni i nowi rodzice (liczniki obu trzeba przeliczyć)
+    with transaction.atomic(using=tenancy.write_database()):
+        refresh_offspring_counts(parent_ids)
+        rebuild_lineage(cow_ids)
+
+
+def rebuild_all():
+    # Pełne przeliczenie (np. po wdrożeniu lub ręcznej zmianie bazy)
+    with transaction.atomic(using=tenancy.write_database()):
+        return refresh_offspring_counts(), rebuild_lineage()
+
+
+# === ZAPYTANIA ===
+def offspring(cow):
+    return Cow.objects.filter(lineage_ancestors__ancestor=cow, lineage_ancestors__depth=1)
+
+
+def with_descendants_in_herd(queryset):
+    # Adnotacja descendants_in_herd: potomkowie (wszystkie pokolenia) w tym samym stadzie
+    descendants = CowLineage.objects.filter(
+        ancestor=OuterRef('pk'), descendant__herd=OuterRef('herd')
+    ).order_by().values('ancestor').annotate(n=Count('id')).values('n')
+    return queryset.annotate(descendants_in_herd=Coalesce(Subquery(descendants), Value(0)))
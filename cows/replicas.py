@@ -0,0 +1,141 @@
+# cows/replicas.py
+
+# === REPLIKA DO ODCZYTU I RAPORTÓW ===
+# Ciężkie odczyty (statystyki, eksport, rodowód, historia, raporty) mogą iść do
+# osobnego aliasu z DATABASES (READ_REPLICA['ALIAS']), żeby nie konkurowały
+# z zapisami SyncView na bazie default. Odczyt z repliki jest zawsze jawny:
+# blok read_from_replica() albo widok z ReplicaReadMixin - reszta kodu
+# (walidacja, zapisy, uwierzytelnianie) czyta z default jak dotąd.
+# Urządzenie, które przed chwilą coś zapisało, przez STICKY_SECONDS czyta z
+# default (read-your-writes), bo replika może jeszcze nie mieć jego zmian.
+# Dla SQLite repliką jest kopia pliku default robiona online backup API
+# (refresh_snapshot / komenda refresh_replica_snapshot) - kopiowanie paczkami
+# stron z przerwami, więc zapisy nie czekają na całą kopię.
+
+import contextvars
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ALIAS': None,            # alias z DATABASES (np. 'replica'); None = wszystko z default
+    'STICKY_SECONDS': 30,     # ile po zapisie urządzenie czyta z default
+    'SNAPSHOT_PAGES': 256,    # stron SQLite kopiowanych w jednym kroku backupu
+    'SNAPSHOT_SLEEP': 0.005,  # przerwa między krokami (zapisy mogą wejść pomiędzy)
+}
+DEVICE_HEADER = 'HTTP_X_DEVICE_ID'
+STICKY_KEY = 'replica_sticky:{}'
+
+_read_alias = contextvars.ContextVar('cows_replica_alias', default=None)
+
+
+def get_setting(name):
+    return getattr(settings, 'READ_REPLICA', {}).get(name, DEFAULTS[name])
+
+
+def replica_alias():
+    alias = get_setting('ALIAS')
+    return alias if alias and alias in settings.DATABASES else None
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+    # Odczyty modeli aplikacji cows w bloku idą do repliki (jeśli skonfigurowana)
+    token = _read_alias.set(replica_alias() if enabled else None)
+    try: yield
+    finally: _read_alias.reset(token)
+
+
+# === READ-YOUR-WRITES ===
+def _device_key(request):
+    # Nagłówek X-Device-Id (aplikacja polowa), inaczej zalogowany użytkownik
+    device = request.META.get(DEVICE_HEADER)
+    if device: return STICKY_KEY.format(f"device:{device}")
+    user = getattr(request, 'user', None)
+    return STICKY_KEY.format(f"user:{user.pk}") if user is not None and user.is_authenticated else None
+
+
+def mark_recent_write(request):
+    # Pamięć podręczna z CACHES - przy wielu workerach musi być wspólna (np. Redis)
+    key = _device_key(request)
+    if key and replica_alias(): cache.set(key, True, get_setting('STICKY_SECONDS'))
+
+
+def is_sticky(request):
+    key = _device_key(request)
+    return bool(key) and cache.get(key, False)
+
+
+class ReplicaReadMixin:
+    # Dla widoków DRF: odczyty (GET) akcji z replica_actions (None = wszystkich)
+    # czytają z repliki, chyba że urządzenie dopiero co zapisywało; udane zapisy
+    # (POST/PUT/PATCH/DELETE) włączają dla urządzenia read-your-writes
+    replica_actions = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        action = getattr(self, 'action', None)
+        if request.method in SAFE_METHODS and (self.replica_actions is None or action in self.replica_actions) and not is_sticky(request):
+            self._replica_token = _read_alias.set(replica_alias())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None: _read_alias.reset(token); self._replica_token = None
+        elif request.method not in SAFE_METHODS and response.status_code < 400: mark_recent_write(request)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaRouter:
+    # Tylko modele cows; auth/sesje zawsze z default (np. świeżo dodany użytkownik)
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias and model._meta.app_label == 'cows': return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Obiekt wczytany z repliki zapisujemy do default, nie tam, skąd przyszedł
+        instance = hints.get('instance'); alias = replica_alias()
+        if alias and instance is not None and instance._state.db == alias: return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        alias = replica_alias()
+        if alias and {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, alias}: return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Schemat repliki pochodzi z default (replikacja albo kopia pliku)
+        if db == replica_alias(): return False
+        return None
+
+
+# === SQLITE: KOPIA BAZY JAKO REPLIKA ===
+def refresh_snapshot(alias=None, pages=None, sleep=None):
+    # Kopia do pliku tymczasowego i podmiana (os.replace) - otwarte połączenia
+    # repliki dokończą na starej kopii, nowe zobaczą nową
+    alias = alias or replica_alias()
+    if alias is None: raise ValueError("Brak repliki: ustaw READ_REPLICA['ALIAS'] i DATABASES[alias]")
+    source = connections[DEFAULT_DB_ALIAS]
+    if source.vendor != 'sqlite' or connections[alias].vendor != 'sqlite':
+        raise ValueError("Kopia przez backup API działa tylko dla SQLite (default i replika)")
+    target_path = str(settings.DATABASES[alias]['NAME']); temp_path = f"{target_path}.tmp"
+    source.ensure_connection()
+    target = sqlite3.connect(temp_path)
+    try:
+        source.connection.backup(
+            target, pages=pages or get_setting('SNAPSHOT_PAGES'),
+            sleep=get_setting('SNAPSHOT_SLEEP') if sleep is None else sleep,
+        )
+    finally:
+        target.close()
+    os.replace(temp_path, target_path)
+    logger.info(f"Replika {alias}: odświeżono kopię ({os.path.getsize(target_path)} B)")
+    return target_path
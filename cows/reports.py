@@ -0,0 +1,193 @@
+# cows/reports.py
+
+# === RAPORTY ARiMR (księga rejestracji stada, zdarzenia w okresie) ===
+# Raport powstaje dla stada i okresu: podsumowanie jednym zapytaniem
+# agregującym, wiersze przez values() (bez obiektów modeli). Plik zapisujemy
+# jako kolejną wersję HerdReport. Przed budową liczymy odcisk danych źródłowych
+# (liczba wierszy + ostatnia zmiana, też jednym agregatem) - jeśli zgadza się
+# z ostatnią wersją, zwracamy ją bez czytania wierszy. Dzięki temu comiesięczne
+# raporty (komenda build_reports) przebudowują tylko stada, w których coś się zmieniło.
+
+import hashlib
+import io
+from datetime import date, timedelta
+
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, Max, Q
+
+from .models import ArchivedEvent, Cow, Event, Herd, HerdReport
+from .replicas import read_from_replica
+
+# Zmiana układu pliku = zmiana odcisku, więc stare wersje zostaną przebudowane
+REPORT_FORMAT = 1
+MOVEMENT_EVENT_TYPES = ('WYCIELENIE',)
+KINDS = [kind for kind, _ in HerdReport.KIND_CHOICES]
+
+STATUS_LABELS = {'ACTIVE': 'W STADZIE', 'SOLD': 'SPRZEDANA', 'ARCHIVED': 'PADŁA', 'OTHER': 'INNY'}
+EXIT_LABELS = {'SOLD': 'SPRZEDAŻ', 'ARCHIVED': 'PADNIĘCIE'}
+GENDER_LABELS = {'F': 'SAMICA', 'M': 'SAMIEC'}
+REGISTER_FIELDS = ['tag_id', 'passport_number', 'gender', 'breed', 'birth_date', 'dam__tag_id', 'status', 'exit_date', 'exit_reason', 'business_number']
+REGISTER_HEADERS = ['LP.', 'NR ARIMR', 'NR PASZPORTU', 'PŁEĆ', 'RASA', 'DATA UR', 'NR MATKI', 'STATUS', 'DATA WYJŚCIA', 'NABYWCA/PRZYCZYNA', 'NUMER DZIAŁALNOŚCI']
+MOVEMENT_HEADERS = ['DATA', 'ZDARZENIE', 'NR ARIMR', 'NR PASZPORTU', 'NR MATKI', 'OPIS', 'NUMER DZIAŁALNOŚCI']
+SUMMARY_LABELS = {
+    'opening': 'Stan na początek okresu', 'births': 'Urodzenia', 'sold': 'Sprzedaż', 'dead': 'Padnięcia',
+    'other_exits': 'Inne wyjścia', 'calvings': 'Wycielenia', 'closing': 'Stan na koniec okresu',
+    'closing_females': '  w tym samice', 'closing_males': '  w tym samce',
+}
+
+
+# === OKRESY ===
+def month_period(value):
+    # 'RRRR-MM' -> (pierwszy dzień, ostatni dzień); ValueError przy złym formacie
+    year, month = (int(part) for part in value.split('-'))
+    start = date(year, month, 1)
+    return start, (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def previous_month(today=None):
+    end = (today or date.today()).replace(day=1) - timedelta(days=1)
+    return end.replace(day=1), end
+
+
+# === ZAPYTANIA ŹRÓDŁOWE ===
+def register_queryset(herd, start, end):
+    # Krowy obecne w stadzie choć jeden dzień okresu
+    return Cow.objects.filter(herd=herd).filter(Q(birth_date__isnull=True) | Q(birth_date__lte=end)).filter(
+        Q(exit_date__isnull=True) | Q(exit_date__gte=start)
+    )
+
+
+def movement_event_querysets(herd, start, end):
+    # Bieżące i zarchiwizowane zdarzenia (stare okresy leżą już w archiwum)
+    return [
+        model.objects.filter(cow__herd=herd, date__range=(start, end), event_type__in=MOVEMENT_EVENT_TYPES).order_by()
+        for model in (Event, ArchivedEvent)
+    ]
+
+
+def source_fingerprint(herd, kind, start, end):
+    # Liczba wierszy wyłapuje usunięcia i przeniesienia do innego stada,
+    # najnowsze updated_at - każdą edycję. Archiwizacja zdarzeń nie zmienia odcisku.
+    cows = register_queryset(herd, start, end).order_by().aggregate(n=Count('id'), last=Max('updated_at'))
+    parts = [REPORT_FORMAT, kind, cows['n'], cows['last']]
+    if kind == 'MOVEMENTS':
+        n = 0; last = None
+        for queryset in movement_event_querysets(herd, start, end):
+            events = queryset.aggregate(n=Count('id'), last=Max('updated_at'))
+            n += events['n']
+            if events['last'] and (last is None or events['last'] > last): last = events['last']
+        parts += [n, last]
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def herd_summary(herd, start, end):
+    # Bilans stada w okresie: jedno zapytanie z warunkowymi COUNT
+    not_born_after = lambda day: Q(birth_date__isnull=True) | Q(birth_date__lte=day)
+    not_left_by = lambda day: Q(exit_date__isnull=True) | Q(exit_date__gt=day)
+    opening = not_born_after(start - timedelta(days=1)) & not_left_by(start - timedelta(days=1))
+    closing = not_born_after(end) & not_left_by(end)
+    exited = Q(exit_date__range=(start, end))
+    summary = Cow.objects.filter(herd=herd).order_by().aggregate(
+        opening=Count('id', filter=opening),
+        births=Count('id', filter=Q(birth_date__range=(start, end))),
+        sold=Count('id', filter=exited & Q(status='SOLD')),
+        dead=Count('id', filter=exited & Q(status='ARCHIVED')),
+        other_exits=Count('id', filter=exited & ~Q(status__in=['SOLD', 'ARCHIVED'])),
+        closing=Count('id', filter=closing),
+        closing_females=Count('id', filter=closing & Q(gender='F')),
+        closing_males=Count('id', filter=closing & Q(gender='M')),
+    )
+    summary['calvings'] = sum(queryset.count() for queryset in movement_event_querysets(herd, start, end))
+    return summary
+
+
+# === BUDOWA ARKUSZY ===
+def _write_summary(wb, herd, kind, start, end, summary):
+    sheet = wb.create_sheet('Podsumowanie')
+    sheet.append(['Stado', herd.name]); sheet.append(['Raport', dict(HerdReport.KIND_CHOICES)[kind]])
+    sheet.append(['Okres', f"{start:%Y-%m-%d} - {end:%Y-%m-%d}"]); sheet.append([])
+    for key, label in SUMMARY_LABELS.items(): sheet.append([label, summary[key]])
+
+
+def _write_register(wb, herd, start, end):
+    sheet = wb.create_sheet('Księga rejestracji'); sheet.append(REGISTER_HEADERS); count = 0
+    rows = register_queryset(herd, start, end).order_by('tag_id').values_list(*REGISTER_FIELDS)
+    for count, (tag, passport, gender, breed, born, dam_tag, status, exit_date, exit_reason, business) in enumerate(rows.iterator(chunk_size=2000), 1):
+        sheet.append([
+            count, tag, passport, GENDER_LABELS.get(gender, gender), breed, born, dam_tag,
+            STATUS_LABELS.get(status, status), exit_date, exit_reason, business,
+        ])
+    return count
+
+
+def _movement_rows(herd, start, end):
+    herd_cows = Cow.objects.filter(herd=herd).order_by()
+    fields = ('tag_id', 'passport_number', 'dam__tag_id')
+    for born, *cow, business in herd_cows.filter(birth_date__range=(start, end)).values_list('birth_date', *fields, 'business_number'):
+        yield [born, 'URODZENIE', *cow, None, business]
+    for left, status, reason, *cow, business in herd_cows.filter(exit_date__range=(start, end)).values_list('exit_date', 'status', 'exit_reason', *fields, 'business_number'):
+        yield [left, EXIT_LABELS.get(status, 'WYJŚCIE'), *cow, reason, business]
+    for queryset in movement_event_querysets(herd, start, end):
+        for day, event_type, notes, *cow, business in queryset.values_list('date', 'event_type', 'notes', *[f'cow__{f}' for f in fields], 'cow__business_number'):
+            yield [day, event_type, *cow, notes, business]
+
+
+def _write_movements(wb, herd, start, end):
+    # Zdarzeń w miesiącu jest niewiele - sortujemy w pamięci
+    sheet = wb.create_sheet('Zdarzenia'); sheet.append(MOVEMENT_HEADERS)
+    rows = sorted(_movement_rows(herd, start, end), key=lambda row: (row[0], row[2]))
+    for row in rows: sheet.append(row)
+    return len(rows)
+
+
+def render_report(herd, kind, start, end):
+    # Zwraca (bajty xlsx, liczba wierszy, podsumowanie)
+    from openpyxl import Workbook  # leniwie: openpyxl tylko przy budowie raportu
+
+    wb = Workbook(write_only=True); summary = herd_summary(herd, start, end)
+    _write_summary(wb, herd, kind, start, end, summary)
+    row_count = (_write_register if kind == 'REGISTER' else _write_movements)(wb, herd, start, end)
+    buffer = io.BytesIO(); wb.save(buffer)
+    return buffer.getvalue(), row_count, summary
+
+
+# === WERSJE ===
+def latest_report(herd, kind, start, end):
+    # Z bazy zapisu - replika może jeszcze nie mieć ostatniej wersji
+    return HerdReport.objects.using(router.db_for_write(HerdReport)).filter(herd=herd, kind=kind, period_start=start, period_end=end).order_by('-version').first()
+
+
+def build_report(herd, kind, start, end, user=None, force=False, replica=True):
+    # Zwraca (raport, czy_zbudowany). Bez zmian w danych - ostatnia wersja.
+    if kind not in KINDS: raise ValueError(f"Nieznany rodzaj raportu: {kind}")
+    if start > end: raise ValueError("Początek okresu jest po jego końcu")
+    # Dane źródłowe czytamy z repliki (READ_REPLICA), jeśli jest skonfigurowana;
+    # replica=False (np. urządzenie po świeżym zapisie) - z default, inaczej odcisk
+    # z nieaktualnej repliki zwróciłby poprzednią wersję raportu
+    with read_from_replica(replica): fingerprint = source_fingerprint(herd, kind, start, end)
+    latest = latest_report(herd, kind, start, end)
+    if latest is not None and not force and latest.fingerprint == fingerprint: return latest, False
+
+    with read_from_replica(replica): content, row_count, summary = render_report(herd, kind, start, end)
+    report = HerdReport(
+        herd=herd, kind=kind, period_start=start, period_end=end, version=latest.version + 1 if latest else 1,
+        fingerprint=fingerprint, row_count=row_count, summary=summary, user=user,
+    )
+    report.file.save(f"{kind.lower()}_{start:%Y%m%d}_{end:%Y%m%d}_v{report.version}.xlsx", ContentFile(content), save=False)
+    try:
+        with transaction.atomic(using=router.db_for_write(HerdReport)): report.save()
+    except IntegrityError:
+        # Równoległa budowa zapisała już tę wersję (unikalność herd/kind/okres/wersja):
+        # usuwamy nasz plik i zwracamy raport zwycięzcy
+        report.file.delete(save=False)
+        winner = latest_report(herd, kind, start, end)
+        if winner is None: raise
+        return winner, False
+    return report, True
+
+
+def build_reports(start, end, herds=None, kinds=None, force=False):
+    # Wszystkie stada i rodzaje (np. z crona na koniec miesiąca); zwraca [(raport, czy_zbudowany)]
+    herds = Herd.objects.all() if herds is None else herds
+    return [build_report(herd, kind, start, end, force=force) for herd in herds for kind in (kinds or KINDS)]
@@ -1,7 +1,9 @@
 # cows/serializers.py
 
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Cow, Event, CowDocument, Task, Herd 
+from .models import Cow, CowLineage, Event, CowDocument, Task, Herd, HerdReport
+from .tenancy import TenantMaskedSerializerMixin, TenantScopedSerializerMixin, in_scope
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth.models import User 
 
@@ -30,13 +32,16 @@ class UserPasswordUpdateSerializer(serializers.Serializer):
 class HerdSerializer(serializers.ModelSerializer):
     class Meta:
         model = Herd
-        fields = ['id', 'name', 'description']
+        fields = ['id', 'name', 'description', 'farm']; read_only_fields = ['farm']
 
 # === Serwery Krów (ZE WSZYSTKIMI POLAMI) ===
+def parent_name(context, parent):
+    # Imię rodzica tylko z zakresu użytkownika (rodzic z innego gospodarstwa: samo id w 'dam'/'sire')
+    return parent.name if parent is not None and in_scope(context, parent.herd_id) else None
+
 class CowSerializer(serializers.ModelSerializer):
     age = serializers.SerializerMethodField(); photo = serializers.SerializerMethodField() 
-    dam_name = serializers.CharField(source='dam.name', read_only=True, allow_null=True)
-    sire_name = serializers.CharField(source='sire.name', read_only=True, allow_null=True)
+    dam_name = serializers.SerializerMethodField(); sire_name = serializers.SerializerMethodField()
     herd_name = serializers.CharField(source='herd.name', read_only=True, allow_null=True)
     
     class Meta:
@@ -47,10 +52,14 @@ class CowSerializer(serializers.ModelSerializer):
             'meat_delivery_date', 'notes', 'photo', 'herd', 
             'weight', 'daily_weight_gain', 'pregnancy_duration', 'is_pregnancy_possible',
             'relocation_status', 'duplicates_to_make', 'duplicates_to_order', 'relocation_after_drive',
-            'age', 'dam_name', 'sire_name', 'herd_name', 'created_at', 'updated_at'
+            'age', 'dam_name', 'sire_name', 'herd_name', 'created_at', 'updated_at',
+            'offspring_as_dam_count', 'offspring_as_sire_count'
         ] 
-        read_only_fields = ['created_at', 'updated_at', 'age', 'dam_name', 'sire_name', 'herd_name']
+        read_only_fields = ['created_at', 'updated_at', 'age', 'dam_name', 'sire_name', 'herd_name', 'offspring_as_dam_count', 'offspring_as_sire_count']
     
+    def get_dam_name(self, obj): return parent_name(self.context, obj.dam)
+    def get_sire_name(self, obj): return parent_name(self.context, obj.sire)
+
     def get_age(self, obj):
         if not obj.birth_date: return None
         from datetime import date
@@ -60,7 +69,8 @@ class CowSerializer(serializers.ModelSerializer):
         if obj.photo: request = self.context.get('request'); return request.build_absolute_uri(obj.photo.url) if request else obj.photo.url
         return None
 
-class CowCreateUpdateSerializer(serializers.ModelSerializer):
+class CowCreateUpdateSerializer(TenantScopedSerializerMixin, serializers.ModelSerializer):
+    tenant_fields = {'dam': 'herd', 'sire': 'herd', 'herd': 'id'}
     dam = serializers.PrimaryKeyRelatedField(queryset=Cow.objects.all(), allow_null=True, required=False)
     sire = serializers.PrimaryKeyRelatedField(queryset=Cow.objects.all(), allow_null=True, required=False)
     herd = serializers.PrimaryKeyRelatedField(queryset=Herd.objects.all(), allow_null=True, required=False)
@@ -90,16 +100,22 @@ class CowCreateUpdateSerializer(serializers.ModelSerializer):
     
     def validate(self, data):
         instance = getattr(self, 'instance', None)
+        tenant = self.context.get('tenant')
+        if tenant and tenant.restricted and (data['herd'] is None if 'herd' in data else not instance):
+            raise serializers.ValidationError({'herd': "Wybierz stado."})  # krowa bez stada byłaby poza zakresem
         if instance:
             if data.get('dam') == instance: raise serializers.ValidationError("Krowa nie może być własną matką.")
             if data.get('sire') == instance: raise serializers.ValidationError("Krowa nie może być własnym ojcem.")
+            parents = [p for p in (data.get('dam'), data.get('sire')) if p]
+            if parents and CowLineage.objects.filter(ancestor=instance, descendant__in=parents).exists():
+                raise serializers.ValidationError("Rodzic nie może być potomkiem tej krowy.")
         return data
 
 class CowListSerializer(serializers.ModelSerializer): 
     age = serializers.SerializerMethodField(); photo = serializers.SerializerMethodField()
-    dam_name = serializers.CharField(source='dam.name', read_only=True, allow_null=True)
-    sire_name = serializers.CharField(source='sire.name', read_only=True, allow_null=True)
+    dam_name = serializers.SerializerMethodField(); sire_name = serializers.SerializerMethodField()
     herd_name = serializers.CharField(source='herd.name', read_only=True, allow_null=True)
+    descendants_in_herd = serializers.SerializerMethodField()
     
     class Meta:
         model = Cow; 
@@ -108,9 +124,16 @@ class CowListSerializer(serializers.ModelSerializer):
             'dam_name', 'sire_name', 'herd', 'herd_name', 'passport_number',
             'photo',
             # Dodajemy kluczowe pola do listy
-            'weight', 'pregnancy_duration', 'is_pregnancy_possible' 
+            'weight', 'pregnancy_duration', 'is_pregnancy_possible',
+            'offspring_as_dam_count', 'offspring_as_sire_count', 'descendants_in_herd'
         ] 
     
+    def get_descendants_in_herd(self, obj):
+        return getattr(obj, 'descendants_in_herd', None)  # adnotacja z pedigree.with_descendants_in_herd
+    
+    def get_dam_name(self, obj): return parent_name(self.context, obj.dam)
+    def get_sire_name(self, obj): return parent_name(self.context, obj.sire)
+
     def get_age(self, obj):
         if not obj.birth_date: return None
         from datetime import date
@@ -124,9 +147,10 @@ class CowListSerializer(serializers.ModelSerializer):
         return None
 
 # === SERIALIZERY DLA DRZEWA (Rodowodu) ===
-class CowPedigreeSimpleSerializer(serializers.ModelSerializer):
+# Przodkowie spoza zakresu użytkownika: tylko {'id'} (TenantMaskedSerializerMixin)
+class CowPedigreeSimpleSerializer(TenantMaskedSerializerMixin, serializers.ModelSerializer):
     class Meta: model = Cow; fields = ['id', 'name', 'tag_id', 'gender']
-class CowPedigreeParentSerializer(serializers.ModelSerializer):
+class CowPedigreeParentSerializer(TenantMaskedSerializerMixin, serializers.ModelSerializer):
     dam = CowPedigreeSimpleSerializer(read_only=True); sire = CowPedigreeSimpleSerializer(read_only=True)
     class Meta: model = Cow; fields = ['id', 'name', 'tag_id', 'gender', 'dam', 'sire']
 class CowPedigreeSerializer(serializers.ModelSerializer):
@@ -136,17 +160,19 @@ class CowOffspringSerializer(serializers.ModelSerializer):
     class Meta: model = Cow; fields = ['id', 'name', 'tag_id', 'gender', 'status']
 
 # === Serializer Event ===
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(TenantScopedSerializerMixin, serializers.ModelSerializer):
+    tenant_fields = {'cow': 'herd'}
     user = serializers.StringRelatedField(read_only=True); cow = serializers.PrimaryKeyRelatedField(queryset=Cow.objects.all())
     class Meta:
-        model = Event; fields = ['id', 'cow', 'event_type', 'date', 'notes', 'user', 'created_at']; read_only_fields = ['user', 'created_at'] 
+        model = Event; fields = ['id', 'cow', 'event_type', 'date', 'notes', 'user', 'created_at', 'updated_at']; read_only_fields = ['user', 'created_at', 'updated_at'] 
     def create(self, validated_data):
         request = self.context.get('request');
         if request and hasattr(request, 'user') and request.user.is_authenticated: validated_data['user'] = request.user
         return super().create(validated_data)
 
 # === SERIALIZER DOKUMENTU ===
-class CowDocumentSerializer(serializers.ModelSerializer):
+class CowDocumentSerializer(TenantScopedSerializerMixin, serializers.ModelSerializer):
+    tenant_fields = {'cow': 'herd'}
     user = serializers.StringRelatedField(read_only=True); filename = serializers.CharField(source='filename', read_only=True); file_url = serializers.SerializerMethodField()
     class Meta:
         model = CowDocument; fields = ['id', 'cow', 'title', 'file', 'file_url', 'filename', 'uploaded_at', 'user']; read_only_fields = ['user', 'uploaded_at', 'filename', 'file_url']; extra_kwargs = {'file': {'write_only': True, 'required': True}}
@@ -160,12 +186,46 @@ class CowDocumentSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 # === Serializer Task ===
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(TenantScopedSerializerMixin, serializers.ModelSerializer):
+    tenant_fields = {'cow': 'herd', 'herd': 'id'}
     user = serializers.StringRelatedField(read_only=True); cow = serializers.PrimaryKeyRelatedField(queryset=Cow.objects.filter(status='ACTIVE'), allow_null=True, required=False)
+    herd = serializers.PrimaryKeyRelatedField(queryset=Herd.objects.all(), allow_null=True, required=False)
     cow_name = serializers.CharField(source='cow.name', read_only=True, allow_null=True); cow_tag_id = serializers.CharField(source='cow.tag_id', read_only=True, allow_null=True)
     class Meta:
-        model = Task; fields = ['id', 'cow', 'cow_name', 'cow_tag_id', 'title', 'task_type', 'due_date', 'notes', 'is_completed', 'user', 'created_at']; read_only_fields = ['user', 'created_at', 'cow_name', 'cow_tag_id']
+        model = Task; fields = ['id', 'cow', 'herd', 'cow_name', 'cow_tag_id', 'title', 'task_type', 'due_date', 'notes', 'is_completed', 'user', 'created_at']; read_only_fields = ['user', 'created_at', 'cow_name', 'cow_tag_id']
+    def validate(self, data):
+        # Zadanie bez krowy musi mieć stado, inaczej byłoby poza zakresem użytkownika
+        tenant = self.context.get('tenant'); instance = getattr(self, 'instance', None)
+        cow = data.get('cow', instance.cow if instance else None); herd = data.get('herd', instance.herd if instance else None)
+        if tenant and tenant.restricted and not cow and not herd: raise serializers.ValidationError({'herd': "Wybierz krowę albo stado."})
+        return data
     def create(self, validated_data):
         request = self.context.get('request')
         if request and hasattr(request, 'user') and request.user.is_authenticated: validated_data['user'] = request.user
         return super().create(validated_data)
+
+# === Serializer raportu ARiMR ===
+class HerdReportSerializer(serializers.ModelSerializer):
+    user = serializers.StringRelatedField(read_only=True); herd_name = serializers.CharField(source='herd.name', read_only=True)
+    filename = serializers.CharField(read_only=True); download_url = serializers.SerializerMethodField()
+    class Meta:
+        model = HerdReport; fields = ['id', 'herd', 'herd_name', 'kind', 'period_start', 'period_end', 'version', 'filename', 'download_url', 'row_count', 'summary', 'user', 'created_at']
+    def get_download_url(self, obj):
+        request = self.context.get('request')
+        return request.build_absolute_uri(reverse('herdreport-download', args=[obj.pk])) if request else None
+
+class HerdReportBuildSerializer(TenantScopedSerializerMixin, serializers.Serializer):
+    # Okres: month (RRRR-MM) albo period_start + period_end
+    tenant_fields = {'herd': 'id'}
+    herd = serializers.PrimaryKeyRelatedField(queryset=Herd.objects.all())
+    kind = serializers.ChoiceField(choices=HerdReport.KIND_CHOICES)
+    month = serializers.RegexField(r'^\d{4}-(0[1-9]|1[0-2])$', required=False)
+    period_start = serializers.DateField(required=False); period_end = serializers.DateField(required=False)
+    force = serializers.BooleanField(default=False)
+    def validate(self, data):
+        from .reports import month_period
+        if data.get('month'): data['period_start'], data['period_end'] = month_period(data['month'])
+        if not (data.get('period_start') and data.get('period_end')):
+            raise serializers.ValidationError("Podaj month (RRRR-MM) albo period_start i period_end.")
+        if data['period_start'] > data['period_end']: raise serializers.ValidationError("period_start jest po period_end.")
+        return data
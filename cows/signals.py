@@ -0,0 +1,108 @@
+# cows/signals.py
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from django.contrib.auth.models import User
+
+from . import changefeed, pedigree, tenancy
+from .authentication import user_cache
+from .models import Cow, CowDocument, Event, FarmMembership, Task
+
+# === STRUMIEŃ ZMIAN: nazwa modelu w komunikacie i pole "ostatniej zmiany" ===
+CHANGEFEED_MODELS = {
+    Cow: ('cow', 'updated_at'),
+    Event: ('event', 'updated_at'),
+    Task: ('task', 'created_at'),
+    CowDocument: ('document', 'uploaded_at'),
+}
+
+
+def _herd_id(instance):
+    # Cow, Event, Task: stado w wierszu (kopia klucza najemcy); CowDocument - przez krowę
+    if isinstance(instance, (Cow, Event, Task)): return instance.herd_id
+    if not instance.cow_id: return None
+    if type(instance).cow.is_cached(instance): return instance.cow.herd_id
+    return Cow.objects.filter(pk=instance.cow_id).values_list('herd_id', flat=True).first()
+
+
+def _publish_change(instance, op):
+    model, updated_field = CHANGEFEED_MODELS[type(instance)]
+    updated_at = getattr(instance, updated_field) if op != 'delete' else None
+    herd_id = _herd_id(instance); pk = instance.pk; database = instance._state.db
+    # Publikujemy dopiero po commicie, żeby klient nie pobrał niezapisanych danych
+    transaction.on_commit(lambda: changefeed.publish(model, pk, op, updated_at, herd_id=herd_id, database=database), using=database)
+
+
+def changefeed_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw: return
+    _publish_change(instance, 'create' if created else 'update')
+
+
+def changefeed_post_delete(sender, instance, **kwargs):
+    _publish_change(instance, 'delete')
+
+
+for _model in CHANGEFEED_MODELS:
+    post_save.connect(changefeed_post_save, sender=_model, dispatch_uid=f'changefeed_save_{_model.__name__}')
+    post_delete.connect(changefeed_post_delete, sender=_model, dispatch_uid=f'changefeed_delete_{_model.__name__}')
+
+
+# === PAMIĘĆ PODRĘCZNA UŻYTKOWNIKÓW JWT ===
+# Każdy zapis (is_active, is_staff, set_password) lub usunięcie użytkownika
+# od razu unieważnia wpis, żeby dezaktywacja działała bez czekania na TTL.
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+post_save.connect(invalidate_cached_user, sender=User, dispatch_uid='user_cache_invalidate_save')
+post_delete.connect(invalidate_cached_user, sender=User, dispatch_uid='user_cache_invalidate_delete')
+
+
+# === RODOWÓD: liczniki potomstwa i tabela domknięcia ===
+# Przeliczamy tylko przy zmianie dam/sire (rodzice z bazy: Cow._loaded_parents).
+def pedigree_post_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw: return
+    if update_fields is not None and not {'dam', 'sire', 'dam_id', 'sire_id'} & set(update_fields): return
+    current = (instance.dam_id, instance.sire_id)
+    loaded = getattr(instance, '_loaded_parents', None)
+    if (created and current == (None, None)) or loaded == current: return
+    pedigree.parents_changed([instance.pk], [*current, *(p for p in loaded or () if isinstance(p, int))])
+    instance._loaded_parents = current
+
+
+def pedigree_pre_delete(sender, instance, **kwargs):
+    # Po usunięciu dzieci tracą rodzica (SET_NULL) - ich rodowód trzeba przeliczyć
+    # Rodzice z bazy, nie z obiektu (mógł zostać wczytany przed zmianą rodowodu)
+    instance._offspring_ids = list(pedigree.offspring(instance).values_list('id', flat=True))
+    instance._db_parents = Cow.objects.filter(pk=instance.pk).values_list('dam_id', 'sire_id').first() or ()
+
+
+def pedigree_post_delete(sender, instance, **kwargs):
+    pedigree.parents_changed(getattr(instance, '_offspring_ids', []), getattr(instance, '_db_parents', ()))
+
+
+post_save.connect(pedigree_post_save, sender=Cow, dispatch_uid='pedigree_save_cow')
+pre_delete.connect(pedigree_pre_delete, sender=Cow, dispatch_uid='pedigree_pre_delete_cow')
+post_delete.connect(pedigree_post_delete, sender=Cow, dispatch_uid='pedigree_delete_cow')
+
+
+# === NAJEMCY: kopia stada w zdarzeniach/zadaniach i konta w bazach gospodarstw ===
+def tenancy_cow_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw or created: return
+    loaded = getattr(instance, '_loaded_herd', DEFERRED)
+    if loaded == instance.herd_id: return
+    tenancy.cow_herds_changed([instance.pk])
+    instance._loaded_herd = instance.herd_id
+
+
+def tenancy_mirror_user(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    # Tylko zapisy w default (kopia w bazie gospodarstwa też wywołuje post_save)
+    if raw or using != DEFAULT_DB_ALIAS: return
+    tenancy.mirror_user(instance.user if isinstance(instance, FarmMembership) else instance)
+
+
+post_save.connect(tenancy_cow_post_save, sender=Cow, dispatch_uid='tenancy_save_cow')
+post_save.connect(tenancy_mirror_user, sender=User, dispatch_uid='tenancy_mirror_user')
+post_save.connect(tenancy_mirror_user, sender=FarmMembership, dispatch_uid='tenancy_mirror_membership')
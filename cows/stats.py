@@ -0,0 +1,25 @@
+# cows/stats.py
+
+# === WSPÓLNE OBLICZENIA STATYSTYK (widoki sync i async) ===
+
+AGE_BINS = ['0-1', '1-2', '2-5', '5-8', '8+']
+
+
+def calculate_age(birth_date, today):
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+
+def age_statistics(birth_dates, total, today):
+    # Zwraca (średni wiek, dane histogramu) na podstawie samych dat urodzenia
+    age_bins = dict.fromkeys(AGE_BINS, 0); avg_age_sum = 0
+    for birth_date in birth_dates:
+        if not birth_date: continue
+        age = calculate_age(birth_date, today); avg_age_sum += age
+        if age <= 1: age_bins['0-1'] += 1
+        elif age <= 2: age_bins['1-2'] += 1
+        elif age <= 5: age_bins['2-5'] += 1
+        elif age <= 8: age_bins['5-8'] += 1
+        else: age_bins['8+'] += 1
+    avg_age = (avg_age_sum / total) if total > 0 else 0
+    histogram = [{"name": f"{key} lat", "ilość": age_bins[key]} for key in AGE_BINS]
+    return avg_age, histogram
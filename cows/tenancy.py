@@ -0,0 +1,285 @@
+# cows/tenancy.py
+
+# === WIELE GOSPODARSTW NA JEDNEJ INSTANCJI ===
+# Użytkownik jest przypisany (FarmMembership) do całego gospodarstwa albo do
+# pojedynczych stad. Z przypisań liczymy raz na żądanie zakres (TenantScope):
+# zbiór id stad, a widoki filtrują po nim querysety automatycznie
+# (TenantScopedMixin). Kluczem najemcy jest stado - Cow.herd oraz kopie
+# w Event/ArchivedEvent/Task, z indeksami złożonymi zaczynającymi się od herd.
+# Superużytkownik widzi wszystko (albo jedno gospodarstwo - nagłówek X-Farm-Id).
+# Kopie stada w istniejących wierszach uzupełnia komenda backfill_herd_keys
+# (wymagany krok wdrożenia - bez niej stare dane mają herd = NULL).
+# Użytkownik bez przypisań: gdy istnieje choć jedno gospodarstwo, konto spoza
+# personelu nie widzi nic (TENANCY['REQUIRE_MEMBERSHIP'] = None); True/False - jawnie.
+#
+# Osobna baza gospodarstwa: Farm.database = alias z TENANCY['DATABASES']. W żądaniu
+# takiego gospodarstwa TenantRouter kieruje tam wszystkie modele poza Farm
+# i FarmMembership (te zawsze w default), więc import czy raporty jednego
+# gospodarstwa nie blokują pliku SQLite innego. Użytkowników z przypisaniem
+# kopiujemy do bazy gospodarstwa (mirror_user), a działającego tam bez przypisania
+# (superużytkownik z X-Farm-Id) przy wyznaczaniu zakresu (ensure_user_mirrored),
+# żeby działały klucze obce "Operator".
+
+import contextvars
+from contextlib import contextmanager
+from copy import copy
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core import checks
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, transaction
+from django.db.models import OuterRef, Subquery
+from rest_framework.exceptions import PermissionDenied
+
+from .models import ArchivedEvent, Cow, Event, Farm, FarmMembership, Herd, Task
+
+DEFAULTS = {
+    'DATABASES': [],              # aliasy z DATABASES dozwolone jako Farm.database
+    'REQUIRE_MEMBERSHIP': None,   # konto bez przypisania nie widzi danych: None - spoza personelu, gdy są gospodarstwa; True - każde; False - żadne
+}
+FARM_HEADER = 'HTTP_X_FARM_ID'
+SHARED_MODELS = {'cows.farm', 'cows.farmmembership'}
+BATCH_SIZE = 1000
+MIRRORED_KEY = 'tenant_user_mirrored:{}:{}'
+MIRRORED_SECONDS = 3600
+
+_tenant_alias = contextvars.ContextVar('cows_tenant_alias', default=None)
+
+
+def get_setting(name):
+    return getattr(settings, 'TENANCY', {}).get(name, DEFAULTS[name])
+
+
+def tenant_databases():
+    return [alias for alias in get_setting('DATABASES') if alias in settings.DATABASES]
+
+
+# === ZAKRES UŻYTKOWNIKA ===
+class TenantScope:
+    # herd_ids: None = bez ograniczeń; farm_ids: gospodarstwa przypisane w całości;
+    # alias: baza gospodarstwa (None = default)
+    __slots__ = ('herd_ids', 'farm_ids', 'alias')
+
+    def __init__(self, herd_ids=None, farm_ids=frozenset(), alias=None):
+        self.herd_ids = herd_ids; self.farm_ids = farm_ids; self.alias = alias
+
+    @property
+    def restricted(self):
+        return self.herd_ids is not None
+
+    def allows(self, herd_id):
+        return self.herd_ids is None or herd_id in self.herd_ids
+
+
+UNRESTRICTED = TenantScope()
+NO_ACCESS = TenantScope(herd_ids=frozenset())
+
+
+def membership_required(user):
+    required = get_setting('REQUIRE_MEMBERSHIP')
+    if required is None: return not user.is_staff and Farm.objects.using(DEFAULT_DB_ALIAS).exists()
+    return required
+
+
+def check_require_membership(app_configs=None, **kwargs):
+    # Jawne REQUIRE_MEMBERSHIP = False przy istniejących gospodarstwach: konto bez przypisania widzi wszystkie
+    if get_setting('REQUIRE_MEMBERSHIP') is not False: return []
+    try: has_farms = Farm.objects.using(DEFAULT_DB_ALIAS).exists()
+    except DatabaseError: return []  # np. przed pierwszym migrate
+    if not has_farms: return []
+    return [checks.Warning(
+        "TENANCY['REQUIRE_MEMBERSHIP'] = False przy zdefiniowanych gospodarstwach: konta bez przypisania widzą dane wszystkich gospodarstw.",
+        hint="Usuń ustawienie (None - tylko personel bez przypisania widzi wszystko) albo ustaw True.",
+        id='cows.W001',
+    )]
+
+
+def resolve_scope(user, farm_id=None):
+    # PermissionDenied: nieznane gospodarstwo albo przypisania w kilku bazach naraz
+    try: farm_id = int(farm_id) if farm_id not in (None, '') else None
+    except (TypeError, ValueError): raise PermissionDenied("Nieprawidłowe gospodarstwo (X-Farm-Id).")
+    if not user or not user.is_authenticated: return NO_ACCESS
+    if user.is_superuser:
+        if farm_id is None: return UNRESTRICTED
+        grants = [(farm, None) for farm in Farm.objects.using(DEFAULT_DB_ALIAS).filter(pk=farm_id)]
+    else:
+        memberships = FarmMembership.objects.using(DEFAULT_DB_ALIAS).filter(user=user).select_related('farm')
+        if farm_id is not None: memberships = memberships.filter(farm_id=farm_id)
+        grants = [(m.farm, m.herd_id) for m in memberships]
+        if not grants and farm_id is None:
+            return NO_ACCESS if membership_required(user) else UNRESTRICTED
+    if not grants: raise PermissionDenied("Brak dostępu do tego gospodarstwa.")
+
+    aliases = {farm.database or None for farm, _ in grants}
+    if len(aliases) > 1: raise PermissionDenied("Gospodarstwa w różnych bazach - wybierz jedno nagłówkiem X-Farm-Id.")
+    alias = aliases.pop()
+    farm_ids = frozenset(farm.pk for farm, herd_id in grants if herd_id is None)
+    herd_ids = {herd_id for _, herd_id in grants if herd_id}
+    if farm_ids:
+        herd_ids.update(Herd.objects.using(alias or DEFAULT_DB_ALIAS).filter(farm_id__in=farm_ids).values_list('id', flat=True))
+    if alias: ensure_user_mirrored(user, alias)
+    return TenantScope(frozenset(herd_ids), farm_ids, alias)
+
+
+def request_farm_id(request):
+    # Nagłówek X-Farm-Id; strumień zmian (EventSource bez nagłówków) - gospodarstwo z biletu
+    auth = getattr(request, 'auth', None)
+    if isinstance(auth, dict) and 'farm' in auth: return auth['farm']
+    return request.META.get(FARM_HEADER)
+
+
+def request_scope(request):
+    # Liczony raz na żądanie (widok, serializery, zapytania pomocnicze)
+    scope = getattr(request, '_tenant_scope', None)
+    if scope is None:
+        scope = request._tenant_scope = resolve_scope(getattr(request, 'user', None), request_farm_id(request))
+    return scope
+
+
+def scope_queryset(queryset, scope, field='herd'):
+    # field: ścieżka do id stada (np. 'herd', 'cow__herd', 'id' dla Herd)
+    if scope is None or not scope.restricted: return queryset
+    return queryset.filter(**{f'{field}__in': scope.herd_ids})
+
+
+def farm_herds(farm):
+    # Stada gospodarstwa z jego bazy (panel admina działa na default)
+    return Herd.objects.using(farm.database or DEFAULT_DB_ALIAS).filter(farm=farm)
+
+
+def write_database():
+    # Alias dla transaction.atomic(using=...) - transakcja musi objąć bazę, do której piszemy
+    return _tenant_alias.get() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def tenant_database(alias):
+    # Wszystkie zapytania w bloku idą do bazy gospodarstwa (None = jak dotąd)
+    token = _tenant_alias.set(alias or None)
+    try: yield
+    finally: _tenant_alias.reset(token)
+
+
+class TenantScopedMixin:
+    # Dla widoków DRF: self.tenant po uwierzytelnieniu, get_queryset zawężony
+    # po tenant_field (None = widok filtruje sam), baza gospodarstwa na czas żądania
+    tenant_field = 'herd'
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.tenant = request_scope(request)
+        if self.tenant.alias: self._tenant_token = _tenant_alias.set(self.tenant.alias)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_tenant_token', None)
+        if token is not None: _tenant_alias.reset(token); self._tenant_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.tenant_field is None: return queryset
+        return scope_queryset(queryset, getattr(self, 'tenant', NO_ACCESS), self.tenant_field)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context(); context['tenant'] = getattr(self, 'tenant', NO_ACCESS)
+        return context
+
+
+class TenantScopedSerializerMixin:
+    # Pola powiązań (krowa, stado, rodzice) przyjmują tylko obiekty z zakresu
+    # użytkownika: {nazwa pola: ścieżka do id stada}; zakres z context['tenant']
+    # Bieżąca wartość edytowanego obiektu zostaje dozwolona (np. matka przeniesiona
+    # do innego gospodarstwa) - odrzucamy tylko nowe powiązania spoza zakresu
+    tenant_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields(); scope = self.context.get('tenant')
+        instance = self.instance if hasattr(self.instance, '_meta') else None
+        for name, path in self.tenant_fields.items():
+            field = fields.get(name)
+            if field is None or getattr(field, 'queryset', None) is None: continue
+            base = field.queryset; scoped = scope_queryset(base, scope, path)
+            current = getattr(instance, f'{field.source or name}_id', None) if instance is not None else None
+            field.queryset = (scoped | base.filter(pk=current)) if current is not None and scoped is not base else scoped
+        return fields
+
+
+def in_scope(context, herd_id):
+    # Odczyt powiązań: rodzic z gospodarstwa spoza zakresu jest maskowany
+    scope = context.get('tenant'); return scope is None or scope.allows(herd_id)
+
+
+class TenantMaskedSerializerMixin:
+    # Obiekt spoza zakresu (np. matka w innym gospodarstwie) - zwracamy tylko id
+    def to_representation(self, instance):
+        if not in_scope(self.context, instance.herd_id): return {'id': instance.pk}
+        return super().to_representation(instance)
+
+
+# === KOPIE STADA (klucz najemcy w zdarzeniach i zadaniach) ===
+def cow_herds_changed(cow_ids):
+    # Po przeniesieniu krów do innego stada: jedno UPDATE na tabelę i paczkę krów;
+    # zwraca {model: liczba poprawionych wierszy}
+    cow_ids = list(cow_ids); updated = {model: 0 for model in (Event, ArchivedEvent, Task)}
+    herd = Subquery(Cow.objects.filter(pk=OuterRef('cow_id')).values('herd_id')[:1])
+    for start in range(0, len(cow_ids), BATCH_SIZE):
+        chunk = cow_ids[start:start + BATCH_SIZE]
+        for model in updated: updated[model] += model.objects.filter(cow_id__in=chunk).update(herd_id=herd)
+    return updated
+
+
+def backfill_herd_keys(batch_size=BATCH_SIZE, task_herd=None):
+    # Wymagany krok wdrożenia (komenda backfill_herd_keys): wiersze sprzed klucza
+    # najemcy mają herd = NULL i znikają z widoków użytkowników z przypisaniem.
+    # Przepisuje stado krowy paczkami krów (po kluczu, transakcja na paczkę) -
+    # można uruchamiać ponownie. task_herd: stado dla zadań bez krowy i bez stada.
+    totals = {model: 0 for model in (Event, ArchivedEvent, Task)}; last_pk = 0
+    while True:
+        chunk = list(Cow.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not chunk: break
+        with transaction.atomic(using=write_database()):
+            for model, count in cow_herds_changed(chunk).items(): totals[model] += count
+        last_pk = chunk[-1]
+    if task_herd is not None:
+        totals[Task] += Task.objects.filter(cow__isnull=True, herd__isnull=True).update(herd=task_herd)
+    return totals
+
+
+# === OSOBNE BAZY GOSPODARSTW ===
+def mirror_user(user):
+    # Kopia konta w bazach gospodarstw użytkownika (zapis do default nie zmienia się)
+    aliases = set(
+        FarmMembership.objects.using(DEFAULT_DB_ALIAS).filter(user=user).exclude(farm__database='').values_list('farm__database', flat=True)
+    ) & set(tenant_databases())
+    for alias in aliases: copy(user).save(using=alias); cache.set(MIRRORED_KEY.format(alias, user.pk), True, MIRRORED_SECONDS)
+    return aliases
+
+
+def ensure_user_mirrored(user, alias):
+    # Działający w bazie gospodarstwa bez przypisania (superużytkownik z X-Farm-Id)
+    # też zapisuje Event/Task.user - konto musi tam istnieć przed pierwszym zapisem
+    key = MIRRORED_KEY.format(alias, user.pk)
+    if cache.get(key): return
+    if not type(user).objects.using(alias).filter(pk=user.pk).exists(): copy(user).save(using=alias)
+    cache.set(key, True, MIRRORED_SECONDS)
+
+
+class TenantRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower in SHARED_MODELS: return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if isinstance(instance, FarmMembership) and model is Herd and instance.farm_id:
+            # Stado przypisania (walidacja FK, membership.herd) - z bazy jego gospodarstwa
+            return instance.farm.database or DEFAULT_DB_ALIAS
+        return _tenant_alias.get()
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Przypisanie (default) wskazuje stado w bazie gospodarstwa
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, *tenant_databases()}: return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in tenant_databases() and f"{app_label}.{model_name}" in SHARED_MODELS: return False
+        return None
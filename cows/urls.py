@@ -3,8 +3,10 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     CowViewSet, EventViewSet, SyncView, UserViewSet, 
-    CowDocumentViewSet, TaskViewSet, HerdViewSet
+    CowDocumentViewSet, TaskViewSet, HerdViewSet, SlowQueriesView, ChangeStreamTicketView,
+    ImportPreviewViewSet, HerdReportViewSet
 )
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'cows', CowViewSet) 
@@ -13,8 +15,20 @@ router.register(r'users', UserViewSet)
 router.register(r'documents', CowDocumentViewSet)
 router.register(r'tasks', TaskViewSet) 
 router.register(r'herds', HerdViewSet) # <-- Upewnij się, że to jest
+router.register(r'import-previews', ImportPreviewViewSet)
+router.register(r'reports', HerdReportViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
     path('sync/', SyncView.as_view(), name='sync'),
+    path('metrics/slow-queries/', SlowQueriesView.as_view(), name='slow-queries'),
+
+    # === Ścieżka odczytu async (ASGI) dla urządzeń polowych ===
+    path('async/cows/', async_views.cow_list, name='async-cow-list'),
+    path('async/cows/search/', async_views.cow_search, name='async-cow-search'),
+    path('async/cows/stats/', async_views.cow_stats, name='async-cow-stats'),
+    path('async/cows/<int:pk>/', async_views.cow_detail, name='async-cow-detail'),
+    path('async/tasks/', async_views.task_list, name='async-task-list'),
+    path('changes/ticket/', ChangeStreamTicketView.as_view(), name='change-stream-ticket'),
+    path('changes/stream/', async_views.change_stream, name='change-stream'),
 ]
@@ -5,7 +5,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Cow, Event, CowDocument, Task, Herd 
+from .models import Cow, Event, ArchivedEvent, CowDocument, Task, Herd, HerdReport, ImportPreview
+from .archive import event_history, get_archived_event
 from .serializers import (
     CowSerializer, 
     CowCreateUpdateSerializer, 
@@ -18,61 +19,84 @@ from .serializers import (
     UserCreateSerializer, 
     UserPasswordUpdateSerializer,
     CowPedigreeSerializer,
-    CowOffspringSerializer
+    CowOffspringSerializer,
+    HerdReportSerializer,
+    HerdReportBuildSerializer
 )
 from django.db import transaction, IntegrityError
 import logging
-from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
-from django.contrib.auth.models import User 
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser, BasePermission
+from django.contrib.auth.models import AnonymousUser, User 
+from django.utils.crypto import constant_time_compare
+from rest_framework.authentication import BaseAuthentication
 from datetime import date, timedelta
 from django.db.models import Count, Q 
-import pandas as pd 
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import reverse
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
+import time
+from . import metrics, pedigree
+from .authentication import CachedJWTAuthentication, issue_stream_ticket
+from .filters import CowFilter
+from .pedigree import with_descendants_in_herd
+from .replicas import ReplicaReadMixin, is_sticky
+from . import tenancy
+from .tenancy import TenantScopedMixin, scope_queryset
+from .stats import age_statistics
 
 logger = logging.getLogger(__name__)
 
 # === WIDOK SYNCHRONIZACJI (BEZ ZMIAN) ===
-class SyncView(views.APIView):
+class SyncView(TenantScopedMixin, ReplicaReadMixin, views.APIView):
+    # Po udanej synchronizacji urządzenie czyta z bazy default (read-your-writes);
+    # zadania widzą tylko krowy i zadania ze stad użytkownika
     parser_classes = [JSONParser]
     permission_classes = [IsAuthenticated] 
     def post(self, request, *args, **kwargs):
         jobs = request.data.get('jobs', [])
         results = []
         temp_id_map = {} 
+        tenant = self.tenant; context = {'request': request, 'tenant': tenant}
+        cows = scope_queryset(Cow.objects.all(), tenant); tasks = scope_queryset(Task.objects.all(), tenant)
         try:
-            with transaction.atomic():
+            with transaction.atomic(using=tenancy.write_database()):
                 for job in jobs:
                     action = job.get('action'); payload = job.get('payload', {}); temp_id = job.get('tempId'); entity_id = job.get('entityId'); queue_id = job.get('id') 
                     job_result = {"queueId": queue_id, "tempId": temp_id, "entityId": entity_id, "action": action, "status": "pending"}
+                    job_started = time.perf_counter()
                     try:
                         if action == 'createCow' or action == 'updateCow':
                             if 'dam' in payload and payload['dam'] in temp_id_map: payload['dam'] = temp_id_map[payload['dam']]
                             if 'sire' in payload and payload['sire'] in temp_id_map: payload['sire'] = temp_id_map[payload['sire']]
                             if action == 'createCow':
-                                payload.pop('id', None); serializer = CowCreateUpdateSerializer(data=payload)
+                                payload.pop('id', None); serializer = CowCreateUpdateSerializer(data=payload, context=context)
                             else: 
                                 real_id = temp_id_map.get(entity_id, entity_id) 
                                 if real_id < 0: job_result.update(status="merged", realId=real_id); continue
-                                cow = Cow.objects.get(id=real_id); serializer = CowCreateUpdateSerializer(cow, data=payload, partial=True)
+                                cow = cows.get(id=real_id); serializer = CowCreateUpdateSerializer(cow, data=payload, partial=True, context=context)
                             if serializer.is_valid(raise_exception=True):
                                 saved_cow = serializer.save(); temp_id_map[temp_id or entity_id] = saved_cow.id; job_result.update(status="ok", realId=saved_cow.id)
                         elif action == 'deleteCow': # Archiwizacja
                             real_id = temp_id_map.get(entity_id, entity_id)
-                            if real_id > 0: cow = Cow.objects.get(id=real_id); cow.status = 'ARCHIVED'; cow.save()
+                            if real_id > 0: cow = cows.get(id=real_id); cow.status = 'ARCHIVED'; cow.save()
                             job_result.update(status="ok", realId=real_id)
                         elif action == 'createEvent':
                             payload.pop('id', None); cow_id = payload.get('cow')
                             if cow_id in temp_id_map: payload['cow'] = temp_id_map[payload['cow']]
-                            serializer = EventSerializer(data=payload, context={'request': request})
+                            serializer = EventSerializer(data=payload, context=context)
                             if serializer.is_valid(raise_exception=True):
                                 new_event = serializer.save(); temp_id_map[temp_id] = new_event.id; job_result.update(status="ok", realId=new_event.id)
                         elif action == 'deleteDocument':
                             real_id = temp_id_map.get(entity_id, entity_id)
-                            if real_id > 0: CowDocument.objects.get(id=real_id).delete()
+                            if real_id > 0: scope_queryset(CowDocument.objects.all(), tenant, 'cow__herd').get(id=real_id).delete()
                             job_result.update(status="ok", realId=real_id)
                         elif action == 'createTask':
                             payload.pop('id', None); cow_id = payload.get('cow')
                             if cow_id and cow_id in temp_id_map: payload['cow'] = temp_id_map[cow_id]
-                            serializer = TaskSerializer(data=payload, context={'request': request})
+                            serializer = TaskSerializer(data=payload, context=context)
                             if serializer.is_valid(raise_exception=True):
                                 new_task = serializer.save(); temp_id_map[temp_id] = new_task.id; job_result.update(status="ok", realId=new_task.id)
                         elif action == 'updateTask':
@@ -81,23 +105,62 @@ class SyncView(views.APIView):
                             else:
                                 cow_id = payload.get('cow');
                                 if cow_id and cow_id in temp_id_map: payload['cow'] = temp_id_map[cow_id]
-                                task = Task.objects.get(id=real_id); serializer = TaskSerializer(task, data=payload, partial=True)
+                                task = tasks.get(id=real_id); serializer = TaskSerializer(task, data=payload, partial=True, context=context)
                                 if serializer.is_valid(raise_exception=True): serializer.save(); job_result.update(status="ok", realId=real_id)
                         elif action == 'deleteTask':
                             real_id = temp_id_map.get(entity_id, entity_id)
-                            if real_id > 0: Task.objects.get(id=real_id).delete()
+                            if real_id > 0: tasks.get(id=real_id).delete()
                             job_result.update(status="ok", realId=real_id)
                         else: raise Exception(f"Nieznana akcja: {action}")
                     except IntegrityError as e: logger.warning(f"Błąd walidacji {job}: {str(e)}"); job_result.update(status="error", error=f"Błąd walidacji: {str(e)}")
                     except (Cow.DoesNotExist, CowDocument.DoesNotExist, Task.DoesNotExist) as e: 
                         logger.warning(f"Nie znaleziono obiektu {job}: {str(e)}"); job_result.update(status="error", error=str(e))
                     except Exception as e: logger.error(f"Błąd przetwarzania zadania {job}: {str(e)}"); job_result.update(status="error", error=str(e))
+                    finally: metrics.registry.observe_sync_job(action, job_result['status'], time.perf_counter() - job_started)
                     results.append(job_result)
             return Response({"status": "ok", "results": results}, status=status.HTTP_200_OK)
         except Exception as e:
             logger.error(f"Krytyczny błąd transakcji: {str(e)}")
             return Response({"status": "error", "message": f"Transakcja nie powiodła się: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
 
+# === METRYKI (Prometheus) ===
+METRICS_TOKEN_AUTH = 'metrics-token'
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    # Scraper Prometheusa: "Authorization: Bearer <METRICS['TOKEN']>" (authorization w scrape_config);
+    # inny token Bearer przechodzi dalej do JWT. Adres IP nie wystarcza - za proxy każdy to 127.0.0.1.
+    def authenticate(self, request):
+        expected = metrics.get_setting('TOKEN', None); header = request.META.get('HTTP_AUTHORIZATION', '')
+        if not expected or not header.startswith('Bearer '): return None
+        if not constant_time_compare(header[len('Bearer '):], expected): return None
+        return AnonymousUser(), METRICS_TOKEN_AUTH
+
+class MetricsPermission(BasePermission):
+    # Token scrapera albo zalogowany administrator
+    def has_permission(self, request, view):
+        if request.auth == METRICS_TOKEN_AUTH: return True
+        return bool(request.user and request.user.is_staff)
+
+class MetricsView(views.APIView):
+    authentication_classes = [MetricsTokenAuthentication, CachedJWTAuthentication]
+    permission_classes = [MetricsPermission]
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# === BILET STRUMIENIA ZMIAN (SSE) ===
+class ChangeStreamTicketView(views.APIView):
+    # Krótkotrwały, jednorazowy bilet dla EventSource zamiast tokena dostępowego w URL
+    permission_classes = [IsAuthenticated]
+    def post(self, request, *args, **kwargs):
+        tenancy.request_scope(request)  # PermissionDenied dla obcego X-Farm-Id już przy wydaniu
+        ticket, expires_in = issue_stream_ticket(request.user, request.META.get(tenancy.FARM_HEADER))
+        return Response({"ticket": ticket, "expires_in": expires_in})
+
+class SlowQueriesView(views.APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    def get(self, request, *args, **kwargs):
+        return Response({"slow_queries": metrics.registry.slow_queries()})
+
 # === UserViewSet (BEZ ZMIAN) ===
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all().order_by('username')
@@ -114,24 +177,35 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 # === HerdViewSet (BEZ ZMIAN) ===
-class HerdViewSet(viewsets.ModelViewSet):
+class HerdViewSet(TenantScopedMixin, viewsets.ModelViewSet):
     queryset = Herd.objects.all()
     serializer_class = HerdSerializer
     permission_classes = [IsAuthenticated] 
     pagination_class = None
+    tenant_field = 'id'
+    def perform_create(self, serializer):
+        # Nowe stado trafia do gospodarstwa użytkownika; przypisanym do pojedynczych stad nie wolno
+        if not self.tenant.restricted: serializer.save(); return
+        if len(self.tenant.farm_ids) != 1: raise PermissionDenied("Nowe stado może dodać tylko osoba przypisana do całego gospodarstwa.")
+        serializer.save(farm_id=next(iter(self.tenant.farm_ids)))
 
 # === CowViewSet (POPRAWIONY IMPORT) ===
-class CowViewSet(viewsets.ModelViewSet):
+class CowViewSet(TenantScopedMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Cow.objects.all().order_by('tag_id') 
     permission_classes = [IsAuthenticated] 
     pagination_class = None 
     parser_classes = (MultiPartParser, FormParser, JSONParser) 
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['gender', 'breed', 'status', 'herd'] 
+    filterset_class = CowFilter
     search_fields = ['name', 'tag_id', 'passport_number'] 
-    ordering_fields = ['tag_id', 'name', 'birth_date', 'status', 'herd'] 
+    ordering_fields = ['tag_id', 'name', 'birth_date', 'status', 'herd', 'offspring_as_dam_count', 'offspring_as_sire_count'] 
     ordering = ['tag_id'] 
+    replica_actions = {'list', 'retrieve', 'search', 'stats', 'pedigree', 'export_excel'}
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list': queryset = with_descendants_in_herd(queryset.select_related('dam', 'sire', 'herd'))
+        return queryset
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']: return CowCreateUpdateSerializer
         if self.action == 'list': return CowListSerializer
@@ -161,26 +235,16 @@ class CowViewSet(viewsets.ModelViewSet):
         tag_id = request.query_params.get('tag_id', None)
         if not tag_id: return Response({'error': 'Brak parametru tag_id'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            cow = Cow.objects.get(tag_id=tag_id); serializer = CowSerializer(cow, context=self.get_serializer_context()); return Response(serializer.data)
+            cow = self.get_queryset().get(tag_id=tag_id); serializer = CowSerializer(cow, context=self.get_serializer_context()); return Response(serializer.data)
         except Cow.DoesNotExist:
             return Response({'error': f'Krowa z tag_id "{tag_id}" nie została znaleziona'}, status=status.HTTP_404_NOT_FOUND)
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        today = date.today(); active_cows = Cow.objects.filter(status='ACTIVE')
+        today = date.today(); active_cows = self.get_queryset().order_by().filter(status='ACTIVE')
         total = active_cows.count(); by_gender = active_cows.values('gender').annotate(count=Count('id'))
-        age_bins = {'0-1': 0, '1-2': 0, '2-5': 0, '5-8': 0, '8+': 0}; avg_age_sum = 0
-        for cow in active_cows:
-            if not cow.birth_date: continue 
-            age = today.year - cow.birth_date.year - ((today.month, today.day) < (cow.birth_date.month, cow.birth_date.day)); avg_age_sum += age
-            if age <= 1: age_bins['0-1'] += 1
-            elif age <= 2: age_bins['1-2'] += 1
-            elif age <= 5: age_bins['2-5'] += 1
-            elif age <= 8: age_bins['5-8'] += 1
-            else: age_bins['8+'] += 1
-        avg_age = (avg_age_sum / total) if total > 0 else 0
-        age_histogram_data = [ {"name": "0-1 lat", "ilość": age_bins['0-1']}, {"name": "1-2 lat", "ilość": age_bins['1-2']}, {"name": "2-5 lat", "ilość": age_bins['2-5']}, {"name": "5-8 lat", "ilość": age_bins['5-8']}, {"name": "8+ lat", "ilość": age_bins['8+']}, ]
+        avg_age, age_histogram_data = age_statistics(active_cows.values_list('birth_date', flat=True), total, today)
         next_7_days = today + timedelta(days=7)
-        upcoming_tasks_qs = Task.objects.filter(is_completed=False, due_date__gte=today, due_date__lte=next_7_days).order_by('due_date')
+        upcoming_tasks_qs = scope_queryset(Task.objects.all(), self.tenant).filter(is_completed=False, due_date__gte=today, due_date__lte=next_7_days).select_related('cow', 'user').order_by('due_date')
         upcoming_tasks_data = TaskSerializer(upcoming_tasks_qs, many=True, context={'request': request}).data
         return Response({
             'total_active': total, 'by_gender': list(by_gender), 'average_age': round(avg_age, 1),
@@ -199,9 +263,9 @@ class CowViewSet(viewsets.ModelViewSet):
     def pedigree(self, request, pk=None):
         try: cow = self.get_object()
         except Cow.DoesNotExist: return Response({"error": "Krowa nie znaleziona"}, status=status.HTTP_404_NOT_FOUND)
-        context = {'request': request} 
+        context = self.get_serializer_context()
         ancestors_serializer = CowPedigreeSerializer(cow, context=context)
-        offspring_qs = Cow.objects.filter(Q(dam=cow) | Q(sire=cow)).distinct()
+        offspring_qs = scope_queryset(pedigree.offspring(cow), self.tenant)
         offspring_serializer = CowOffspringSerializer(offspring_qs, many=True, context=context)
         return Response({ "ancestors": ancestors_serializer.data, "offspring": offspring_serializer.data })
 
@@ -212,131 +276,100 @@ class CowViewSet(viewsets.ModelViewSet):
         if not file:
             return Response({"error": "Brak pliku 'file'."}, status=status.HTTP_400_BAD_REQUEST)
 
-        def clean_date(date_val):
-            if pd.isna(date_val) or pd.isnull(date_val): return None
-            try:
-                dt = pd.to_datetime(date_val, errors='coerce')
-                if pd.isna(dt): return None
-                return dt.date()
-            except Exception: return None
-                
-        def clean_string(str_val):
-            if pd.isna(str_val) or pd.isnull(str_val): return None
-            return str(str_val).strip()
-            
-        def clean_float(float_val):
-            if pd.isna(float_val) or pd.isnull(float_val): return None
-            try:
-                cleaned_val = str(float_val).replace(',', '.')
-                return float(cleaned_val)
-            except: return None
-        
-        def clean_int(int_val):
-            if pd.isna(int_val) or pd.isnull(int_val): return None
-            try: return int(float(int_val)) # Konwertuj na float najpierw
-            except: return None
-
+        dry_run = str(request.query_params.get('dry_run', request.data.get('dry_run', ''))).lower() in ('1', 'true', 'yes')
+        from .importers import create_preview, import_workbook  # leniwie: openpyxl tylko przy imporcie
         try:
-            xls = pd.ExcelFile(file)
-            created_count = 0; updated_count = 0; errors = []; parent_link_map = {};
-            with transaction.atomic():
-                for sheet_name in xls.sheet_names:
-                    herd_name = sheet_name.split(' ')[0].strip().upper()
-                    if not herd_name:
-                        errors.append(f"Arkus_ {sheet_name} ma nieprawidłową nazwę.")
-                        continue
-                    
-                    herd, _ = Herd.objects.get_or_create(name=herd_name)
-                    df = pd.read_excel(xls, sheet_name=sheet_name)
-                    df.columns = [str(col).strip().upper() for col in df.columns]
-                    
-                    # === PEŁNA MAPA KOLUMN ===
-                    COLUMN_MAP = {
-                        'NR ARIMR': 'tag_id', 'NAZWA': 'name', 'DATA UR': 'birth_date',
-                        'PŁEĆ': 'gender', 'RASA': 'breed', 'MAŚĆ': 'color',
-                        'NR PASZPORTU': 'passport_number', 'STATUS': 'status', 
-                        'NR MATKI': 'dam_tag', 'NR OJCA': 'sire_tag',
-                        'DATA SPRZEDAŻY/PADNIĘCIA': 'exit_date', 'NABYWCA/PRZYCZYNA': 'exit_reason',
-                        'KWOTA': 'sale_price', 'DOSTAWA MIĘSA': 'meat_delivery_date', 'UWAGI': 'notes',
-                        'WAGA': 'weight', 'PRZYROST/DZIEŃ': 'daily_weight_gain', 
-                        'DŁUGOŚĆ ISTNIEJĄCEJ CIĄŻY': 'pregnancy_duration',
-                        'MOŻLIWOŚĆ BYCIA CIELNĄ WG ZESTAWIENIA': 'is_pregnancy_possible',
-                        'RELOKACJA': 'relocation_status', 
-                        'DUPLIKATY DO ZALOZENIA': 'duplicates_to_make',
-                        'ZAMOWIC KOLCZYKI DUPLIKATY': 'duplicates_to_order',
-                        'RELKOACJA PO PRXEPEDZIE': 'relocation_after_drive',
-                        'NUMER DZIALALNOSCI': 'business_number'
-                    }
-                    df.rename(columns=COLUMN_MAP, inplace=True)
-                    
-                    for index, row in df.iterrows():
-                        tag_id = clean_string(row.get('tag_id'))
-                        if not tag_id:
-                            errors.append(f"Arkus_ {sheet_name}, Wiersz {index + 2}: Brak 'NR ARIMR'")
-                            continue
-                        
-                        gender_raw = clean_string(row.get('gender', '')) or ''
-                        gender = 'F' if 'SAMICA' in gender_raw or 'JAŁÓWKA' in gender_raw else 'M'
-                        status_raw = clean_string(row.get('status', '')) or ''
-                        status = 'SOLD' if 'SPRZEDAN' in status_raw else \
-                                 'ARCHIVED' if 'PADŁ' in status_raw else 'ACTIVE'
-
-                        defaults = {
-                            'herd': herd, 'name': row.get('name', f"Krowa {tag_id}"),
-                            'gender': gender, 'status': status, 'breed': clean_string(row.get('breed')),
-                            'color': clean_string(row.get('color')),
-                            'passport_number': clean_string(row.get('passport_number')),
-                            'business_number': clean_string(row.get('business_number')),
-                            'exit_reason': clean_string(row.get('exit_reason')), 'notes': clean_string(row.get('notes')),
-                            'birth_date': clean_date(row.get('birth_date')), 'exit_date': clean_date(row.get('exit_date')),
-                            'meat_delivery_date': clean_date(row.get('meat_delivery_date')),
-                            'sale_price': clean_float(row.get('sale_price')),
-                            'weight': clean_float(row.get('weight')),
-                            'daily_weight_gain': clean_float(row.get('daily_weight_gain')),
-                            'pregnancy_duration': clean_string(row.get('pregnancy_duration')),
-                            'is_pregnancy_possible': clean_string(row.get('is_pregnancy_possible')),
-                            'relocation_status': clean_string(row.get('relocation_status')),
-                            'duplicates_to_make': clean_string(row.get('duplicates_to_make')),
-                            'duplicates_to_order': clean_string(row.get('duplicates_to_order')),
-                            'relocation_after_drive': clean_string(row.get('relocation_after_drive')),
-                        }
-                        
-                        final_defaults = {k: v for k, v in defaults.items() if v is not None}
-                        
-                        try:
-                            cow, created = Cow.objects.update_or_create(tag_id=tag_id, defaults=final_defaults)
-                            if created: created_count += 1
-                            else: updated_count += 1
-                            parent_link_map[cow.id] = (
-                                clean_string(row.get('dam_tag')), clean_string(row.get('sire_tag'))
-                            )
-                        except Exception as e:
-                            errors.append(f"Arkus_ {sheet_name}, Wiersz {index + 2} (Tag: {tag_id}): Błąd zapisu - {str(e)}")
-
-                logger.info("Import: Rozpoczynam łączenie rodziców...")
-                all_parent_tags = set()
-                for dam_tag, sire_tag in parent_link_map.values():
-                    if dam_tag: all_parent_tags.add(dam_tag)
-                    if sire_tag: all_parent_tags.add(sire_tag)
-                
-                parents_in_db = Cow.objects.in_bulk(list(all_parent_tags), field_name='tag_id')
-                
-                for cow_id, (dam_tag, sire_tag) in parent_link_map.items():
-                    dam = parents_in_db.get(dam_tag)
-                    sire = parents_in_db.get(sire_tag)
-                    if dam or sire:
-                        Cow.objects.filter(id=cow_id).update(dam=dam, sire=sire)
-                        
-            return Response({
-                "status": "ok", "created": created_count, "updated": updated_count, "errors": errors
-            }, status=status.HTTP_200_OK)
-            
+            if dry_run:
+                preview = create_preview(file, user=request.user, scope=self.tenant)
+                return import_preview_response(request, preview, status_code=status.HTTP_201_CREATED)
+            result = import_workbook(file, scope=self.tenant)
+            return Response({"status": "ok", **result}, status=status.HTTP_200_OK)
         except Exception as e:
             logger.error(f"Krytyczny błąd importu Excela: {str(e)}")
             return Response({"error": f"Błąd przetwarzania pliku: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
 
+    # === EKSPORT EXCEL (układ zgodny z importem) ===
+    @action(detail=False, methods=['get'], url_path='export-excel')
+    def export_excel(self, request):
+        from .exporters import export_workbook  # leniwie: openpyxl tylko przy eksporcie
+        queryset = self.filter_queryset(self.get_queryset())
+        response = HttpResponse(
+            export_workbook(queryset, scope=self.tenant).getvalue(),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        response['Content-Disposition'] = f'attachment; filename="stado_highlander_{date.today():%Y%m%d}.xlsx"'
+        return response
+
+# === PODGLĄD IMPORTU (dry-run) I ZATWIERDZENIE ===
+IMPORT_PREVIEW_KINDS = ('new', 'changed', 'unchanged')
+
+def import_preview_response(request, preview, status_code=status.HTTP_200_OK):
+    # Podsumowanie + stronicowana lista różnic (?kind=new|changed|unchanged, ?page=)
+    entries = preview.entries
+    kind = request.query_params.get('kind')
+    if kind in IMPORT_PREVIEW_KINDS: entries = [e for e in entries if e['kind'] == kind]
+    elif kind == 'unresolved': entries = [e for e in entries if e['unresolved_parents']]
+    paginator = PageNumberPagination(); page = paginator.paginate_queryset(entries, request)
+    # Linki do szczegółów podglądu z bieżącymi parametrami (?kind=), jak PageNumberPagination;
+    # po imporcie z dry_run odpowiedź przychodzi z innego adresu, więc ścieżka zawsze z reverse
+    params = request.query_params.copy(); params.pop('dry_run', None)
+    url = request.build_absolute_uri(f"{reverse('importpreview-detail', args=[preview.pk])}?{params.urlencode()}")
+    def page_link(number): return replace_query_param(url, paginator.page_query_param, number) if number else None
+    return Response({
+        'id': preview.pk, 'status': preview.status, 'file_name': preview.file_name,
+        'summary': preview.summary, 'errors': preview.errors, 'count': len(entries),
+        'next': page_link(paginator.page.has_next() and paginator.page.next_page_number()),
+        'previous': page_link(paginator.page.has_previous() and paginator.page.previous_page_number()),
+        'results': page,
+    }, status=status_code)
+
+class ImportPreviewViewSet(TenantScopedMixin, ReplicaReadMixin, viewsets.GenericViewSet):
+    queryset = ImportPreview.objects.all()
+    permission_classes = [IsAuthenticated]
+    replica_actions = ()  # tylko read-your-writes po zatwierdzeniu
+    tenant_field = None
+    def get_queryset(self):
+        # Podgląd nie ma stada - użytkownik z ograniczonym zakresem widzi tylko swoje
+        queryset = super().get_queryset()
+        return queryset.filter(user=self.request.user) if self.tenant.restricted else queryset
+    def retrieve(self, request, pk=None):
+        return import_preview_response(request, self.get_object())
+    @action(detail=True, methods=['post'])
+    def apply(self, request, pk=None):
+        preview = self.get_object()
+        from .importers import apply_preview
+        try:
+            result = apply_preview(preview.pk)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response({"status": "ok", **result}, status=status.HTTP_200_OK)
+
+# === RAPORTY ARiMR (wersjonowane pliki, przebudowa tylko po zmianie danych) ===
+class HerdReportViewSet(TenantScopedMixin, ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = HerdReport.objects.select_related('herd', 'user')
+    serializer_class = HerdReportSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['herd', 'kind', 'period_start', 'period_end']
+    replica_actions = {'list', 'retrieve', 'download'}
+    @action(detail=False, methods=['post'])
+    def build(self, request):
+        # 201 - nowa wersja; 200 - dane się nie zmieniły, zwracamy ostatnią
+        from .reports import build_report  # leniwie: openpyxl tylko przy budowie raportu
+        params = HerdReportBuildSerializer(data=request.data, context=self.get_serializer_context()); params.is_valid(raise_exception=True)
+        data = params.validated_data
+        report, built = build_report(
+            data['herd'], data['kind'], data['period_start'], data['period_end'],
+            user=request.user, force=data['force'], replica=not is_sticky(request),  # read-your-writes
+        )
+        return Response(self.get_serializer(report).data, status=status.HTTP_201_CREATED if built else status.HTTP_200_OK)
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        report = self.get_object()
+        return FileResponse(report.file.open('rb'), as_attachment=True, filename=report.filename)
+
 # === EventViewSet (BEZ ZMIAN) ===
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(TenantScopedMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Event.objects.all()
     serializer_class = EventSerializer
     permission_classes = [IsAuthenticated] 
@@ -344,14 +377,33 @@ class EventViewSet(viewsets.ModelViewSet):
     filterset_fields = ['cow'] 
     ordering_fields = ['date', 'created_at']
     ordering = ['-date']
+    replica_actions = {'list', 'retrieve'}
     def get_serializer_context(self):
         context = super().get_serializer_context(); context.update({'request': self.request}); return context
+    def list(self, request, *args, **kwargs):
+        # Historia obejmuje też archiwum (UNION); ?archived=0 - tylko bieżące zdarzenia
+        if request.query_params.get('archived') in ('0', 'false'): return super().list(request, *args, **kwargs)
+        events = self.filter_queryset(self.get_queryset())
+        archived = self.filter_queryset(scope_queryset(ArchivedEvent.objects.all(), self.tenant))
+        ordering = filters.OrderingFilter().get_ordering(request, events, self)
+        queryset = event_history(events, archived, [*ordering, '-id'] if ordering else None)
+        page = self.paginate_queryset(queryset)
+        if page is not None: return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
+    def retrieve(self, request, *args, **kwargs):
+        # Zarchiwizowane zdarzenie zachowuje id - tylko do odczytu
+        try: return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            archived = get_archived_event(kwargs.get('pk'))
+            if archived is None or not self.tenant.allows(archived.herd_id): raise
+            return Response(self.get_serializer(archived).data)
 
 # === CowDocumentViewSet (BEZ ZMIAN) ===
-class CowDocumentViewSet(viewsets.ModelViewSet):
+class CowDocumentViewSet(TenantScopedMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = CowDocument.objects.all()
     serializer_class = CowDocumentSerializer
     permission_classes = [IsAuthenticated]
+    tenant_field = 'cow__herd'
     parser_classes = (MultiPartParser, FormParser, JSONParser) 
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['cow']
@@ -368,7 +420,7 @@ class CowDocumentViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
 # === TaskViewSet (BEZ ZMIAN) ===
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(TenantScopedMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated]
@@ -12,12 +12,13 @@ import { CalendarPage } from './pages/CalendarPage';
 import { NavBar } from './components/NavBar';
 import { Button } from './components/ui/button';
 import { Plus } from 'lucide-react';
-import { useState } from 'react';
+import { useEffect, useState } from 'react';
 import { ReloadPrompt } from './components/ReloadPrompt'; 
 import { useAuth } from './contexts/AuthContext';
 import { Toaster } from './components/ui/sonner'; 
 import { ModeToggle } from './components/ModeToggle'; 
 import { cn } from './lib/utils'; 
+import { changeFeed } from './services/api';
 
 // Komponent Głównego Layoutu
 function MainLayout() {
@@ -31,6 +32,12 @@ function MainLayout() {
   // Strona admina POWINNA używać tego layoutu.
   const isDetailPage = location.pathname.startsWith('/cow/');
 
+  // Strumień zmian z serwera zamiast okresowego pobierania całego stada
+  useEffect(() => {
+    changeFeed.connect();
+    return () => changeFeed.disconnect();
+  }, []);
+
   if (isDetailPage) {
     // Tylko strona szczegółów jest renderowana bez layoutu
     return <Outlet />; 
@@ -15,7 +15,18 @@ function PedigreeCard({ cow, gender }) {
       </div>
     );
   }
-  
+  // Przodek z innego gospodarstwa - API zwraca tylko id
+  if (!cow.tag_id) {
+    return (
+      <div className={cn(
+        "flex items-center justify-center p-4 h-20 rounded-lg border border-dashed",
+        "bg-muted/50 text-muted-foreground"
+      )}>
+        Inne gospodarstwo
+      </div>
+    );
+  }
+
   const isMale = gender === 'sire' || cow.gender === 'M';
   
   return (
@@ -45,10 +45,10 @@ const handleResponse = async (response) => {
 };
 
 export const networkApi = {
-  getStats: async () => handleResponse(await authedFetch(`${API_BASE_URL}/cows/stats/`)),
-  getCows: async () => handleResponse(await authedFetch(`${API_BASE_URL}/cows/`)),
-  getCow: async (id) => handleResponse(await authedFetch(`${API_BASE_URL}/cows/${id}/`)),
-  searchCow: async (tagId) => handleResponse(await authedFetch(`${API_BASE_URL}/cows/search/?tag_id=${tagId}`)),
+  getStats: async () => handleResponse(await authedFetch(`${API_BASE_URL}/async/cows/stats/`)),
+  getCows: async () => handleResponse(await authedFetch(`${API_BASE_URL}/async/cows/`)),
+  getCow: async (id) => handleResponse(await authedFetch(`${API_BASE_URL}/async/cows/${id}/`)),
+  searchCow: async (tagId) => handleResponse(await authedFetch(`${API_BASE_URL}/async/cows/search/?tag_id=${tagId}`)),
   getEventsForCow: async (cowId) => handleResponse(await authedFetch(`${API_BASE_URL}/events/?cow=${cowId}`)),
   getTasks: async (filters = {}) => {
     const params = new URLSearchParams();
@@ -56,8 +56,11 @@ export const networkApi = {
     if (filters.end) params.append('due_date__lte', filters.end);
     if (filters.cow) params.append('cow', filters.cow);
     if (filters.is_completed !== undefined) params.append('is_completed', String(filters.is_completed));
-    return handleResponse(await authedFetch(`${API_BASE_URL}/tasks/?${params.toString()}`));
+    return handleResponse(await authedFetch(`${API_BASE_URL}/async/tasks/?${params.toString()}`));
   },
+  getTask: async (id) => handleResponse(await authedFetch(`${API_BASE_URL}/tasks/${id}/`)),
+  getEvent: async (id) => handleResponse(await authedFetch(`${API_BASE_URL}/events/${id}/`)),
+  getDocument: async (id) => handleResponse(await authedFetch(`${API_BASE_URL}/documents/${id}/`)),
   getPedigree: async (id) => handleResponse(await authedFetch(`${API_BASE_URL}/cows/${id}/pedigree/`)),
   getDocuments: async (cowId) => handleResponse(await authedFetch(`${API_BASE_URL}/documents/?cow=${cowId}`)),
   getHerds: async () => handleResponse(await authedFetch(`${API_BASE_URL}/herds/`)),
@@ -167,6 +170,70 @@ export const syncService = {
   }
 };
 
+// === STRUMIEŃ ZMIAN (SSE) ===
+// Serwer wysyła paczki {model, id, op, updated_at}; pobieramy tylko zmienione encje.
+const CHANGE_TABLES = {
+  cow: { table: () => db.cows, fetch: (id) => networkApi.getCow(id) },
+  event: { table: () => db.events, fetch: (id) => networkApi.getEvent(id) },
+  task: { table: () => db.tasks, fetch: (id) => networkApi.getTask(id) },
+  document: { table: () => db.documents, fetch: (id) => networkApi.getDocument(id) },
+};
+// Zamiast tokena w URL (logi serwera/proxy) jednorazowy bilet z POST /changes/ticket/.
+// Po błędzie (wygasły bilet lub token, restart serwera) łączymy się od nowa z nowym
+// biletem i dociągamy zmiany z przerwy.
+const CHANGE_RETRY_MS = 5000;
+let changeSource = null;
+let changeRetry = null;
+let changeActive = false;
+let changeHerds = [];
+const scheduleChangeReconnect = () => {
+  if (!changeActive || changeRetry) return;
+  changeRetry = setTimeout(() => { changeRetry = null; openChangeSource(true); }, CHANGE_RETRY_MS);
+};
+const openChangeSource = async (reconnect = false) => {
+  if (!changeActive || changeSource || !authService.getAccessToken()) return;
+  let ticket;
+  try {
+    ({ ticket } = await handleResponse(await authedFetch(`${API_BASE_URL}/changes/ticket/`, { method: 'POST' })));
+  } catch (err) { scheduleChangeReconnect(); return; }
+  if (!changeActive || changeSource) return;
+  const params = new URLSearchParams({ ticket });
+  changeHerds.forEach(h => params.append('herd', h));
+  const source = new EventSource(`${API_BASE_URL}/changes/stream/?${params.toString()}`);
+  changeSource = source;
+  source.onopen = () => { if (reconnect) { reconnect = false; repository.syncCows(); } };
+  source.addEventListener('changes', async (e) => {
+    const changes = JSON.parse(e.data);
+    for (const change of changes) {
+      if (change.op === 'resync') { repository.syncCows(); continue; }
+      const target = CHANGE_TABLES[change.model];
+      if (!target) continue;
+      try {
+        if (change.op === 'delete') await target.table().delete(change.id);
+        else await target.table().put(await target.fetch(change.id));
+      } catch (err) { console.warn(`Strumień zmian: nie udało się pobrać ${change.model} ${change.id}`, err.message); }
+    }
+  });
+  source.onerror = () => {
+    // Automatyczne ponowienie EventSource użyłoby tego samego (zużytego) biletu
+    source.close();
+    if (changeSource === source) changeSource = null;
+    scheduleChangeReconnect();
+  };
+};
+export const changeFeed = {
+  connect: (herds = []) => {
+    if (changeActive || typeof EventSource === 'undefined') return;
+    changeActive = true; changeHerds = herds;
+    openChangeSource();
+  },
+  disconnect: () => {
+    changeActive = false;
+    clearTimeout(changeRetry); changeRetry = null;
+    changeSource?.close(); changeSource = null;
+  },
+};
+
 export const repository = {
   // Zapytania
   getCowsQuery: (status = 'ACTIVE', herd = 'ALL') => { 
@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'cows.middleware.MetricsMiddleware', # Metryki per widok + profilowanie (nagłówek X-Profile)
     'corsheaders.middleware.CorsMiddleware', 
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -95,7 +96,8 @@ CORS_ALLOW_CREDENTIALS = True
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         # Ustaw JWT jako domyślną metodę uwierzytelniania
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # (z krótką pamięcią podręczną użytkowników - patrz AUTH_USER_CACHE)
+        'cows.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         # Wymagaj bycia zalogowanym dla WSZYSTKICH endpointów domyślnie
@@ -115,3 +117,91 @@ SIMPLE_JWT = {
     "USER_ID_FIELD": "id",
     "USER_ID_CLAIM": "user_id",
 }
+
+# Pamięć podręczna użytkowników z tokena JWT (na proces). Zmiana użytkownika
+# czyści wpis od razu w bieżącym procesie; w pozostałych po TTL_SECONDS.
+AUTH_USER_CACHE = {
+    'TTL_SECONDS': 30,
+    'MAX_SIZE': 1024,
+}
+
+# === ARCHIWUM HISTORII ZDARZEŃ (komenda archive_events) ===
+# Z 'ATTACH_DATABASE': 'archive' archiwum leży w osobnym pliku SQLite - dodaj
+# DATABASES['archive'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'archive.sqlite3'}
+# i utwórz tabelę: python manage.py migrate --database archive
+ARCHIVE = {
+    'EVENT_HORIZON_DAYS': 730,
+    'BATCH_SIZE': 1000,
+    'ATTACH_DATABASE': None,
+}
+
+# === REPLIKA DO ODCZYTU I RAPORTÓW (cows/replicas.py) ===
+# Z 'ALIAS': 'replica' statystyki, eksport, rodowód, historia i raporty czytają z
+# DATABASES['replica']: replika PostgreSQL albo dla SQLite kopia pliku default, np.
+# DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'replica.sqlite3'}
+# odświeżana okresowo: python manage.py refresh_replica_snapshot --every 300
+# Read-your-writes trzyma znacznik w CACHES - przy wielu workerach ustaw wspólny cache.
+READ_REPLICA = {
+    'ALIAS': None,
+    'STICKY_SECONDS': 30,
+    'SNAPSHOT_PAGES': 256,
+    'SNAPSHOT_SLEEP': 0.005,
+}
+
+# === WIELE GOSPODARSTW (cows/tenancy.py) ===
+# Użytkownicy przypisani do gospodarstw/stad (FarmMembership) widzą tylko swoje dane.
+# Osobna baza gospodarstwa: dodaj alias do DATABASES i 'DATABASES' poniżej, np.
+# DATABASES['farm_north'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'farm_north.sqlite3'}
+# python manage.py migrate --database farm_north, potem Farm.database = 'farm_north'.
+# WYMAGANE przy wdrożeniu (migracje nie są w repozytorium, więc nie ma migracji danych):
+# po migrate uruchom python manage.py backfill_herd_keys [--task-herd ID] - dla default
+# i każdej bazy z --database - inaczej dotychczasowe zdarzenia, archiwum i zadania
+# (herd = NULL) znikną użytkownikom z przypisaniem.
+TENANCY = {
+    'DATABASES': [],
+    # Konto bez przypisania: None - gdy istnieje gospodarstwo, spoza personelu nie widzi nic;
+    # True - każde (poza superużytkownikiem) nie widzi nic; False - widzi wszystko (ostrzeżenie cows.W001)
+    'REQUIRE_MEMBERSHIP': None,
+}
+DATABASE_ROUTERS = ['cows.archive.ArchiveRouter', 'cows.tenancy.TenantRouter', 'cows.replicas.ReplicaRouter']
+
+# === PANEL ADMINA DLA DUŻYCH STAD ===
+ADMIN_PERFORMANCE = {
+    'ESTIMATED_COUNT_THRESHOLD': 10000,  # powyżej - szacowana liczba wierszy na liście bez filtrów
+    'FILTER_CACHE_SECONDS': 300,         # pamięć podręczna wartości filtrów (np. rasy)
+}
+
+# Import z Excela: liczba wierszy zapisywanych naraz (od niej zależy szczytowe zużycie pamięci)
+IMPORT_BATCH_SIZE = 500
+
+# === STRUMIEŃ ZMIAN (SSE, wymaga ASGI) ===
+CHANGEFEED = {
+    'BACKEND': 'cows.changefeed.InMemoryBroadcastBackend', # jeden węzeł; dla wielu - własny backend (np. Redis)
+    'COALESCE_SECONDS': 0.5,
+    'HEARTBEAT_SECONDS': 15,
+    'MAX_PENDING': 1000,
+    'TICKET_SECONDS': 60,  # ważność jednorazowego biletu EventSource (POST api/changes/ticket/)
+}
+
+# === METRYKI I PROFILOWANIE ===
+METRICS = {
+    'TOKEN': os.environ.get('METRICS_TOKEN'),  # scraper Prometheusa: Authorization: Bearer <TOKEN>; bez niego tylko administratorzy
+    'SLOW_QUERY_SECONDS': 0.2,      # próg wolnego zapytania SQL
+    'SLOW_QUERY_SAMPLES': 50,       # ile ostatnich wolnych zapytań trzymać
+    'PROFILE_HEADER': 'X-Profile',  # nagłówek włączający profil (tylko administratorzy)
+    'PROFILE_DIR': BASE_DIR / 'profiles',
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {'format': '{asctime} {levelname} {name}: {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'verbose'},
+    },
+    'loggers': {
+        'cows': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
@@ -11,6 +11,7 @@ from rest_framework_simplejwt.views import TokenRefreshView
 # === NOWY IMPORT ===
 # Importujemy nasz niestandardowy serializer z aplikacji 'cows'
 from cows.serializers import MyTokenObtainPairSerializer
+from cows.views import MetricsView
 from rest_framework_simplejwt.views import TokenObtainPairView
 
 # === NOWY WIDOK ===
@@ -27,6 +28,9 @@ urlpatterns = [
     # Podmieniamy domyślny widok na nasz
     path('api/token/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+
+    # Metryki wydajności w formacie Prometheusa
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
 
 if settings.DEBUG: